@@ -10,7 +10,7 @@ from pytensor import tensor as pt
 from bokeh import models
 from bokeh import plotting
 import viz_umbridge as vu
-from umbridge.pymc import UmbridgeOp
+from viz_umbridge.pymc import UmbridgeOp
 
 class StopSamplingCallback(pm.callbacks.Callback):
     def __init__(self, app):
@@ -24,14 +24,14 @@ class PanelPymcApp(vu.UmbridgePanelApp):
 
     def __init__(self, url, model_name="posterior", reset_config=None):
 
-        super().__init__(url, 'Analytic Example', model_name)
+        super().__init__(url, 'Analytic Example', model_name, asynchronous=True)
 
         setattr(self, 'reset_config', reset_config)
 
         self.config = {}
         self.reset_params()
 
-        self.op = UmbridgeOp(args.url, "posterior", config=self.config)
+        self.op = UmbridgeOp(args.url, "posterior", config=self.config, cache_size=1024)
         self.input_dim = self.op.umbridge_model.get_input_sizes()[0]
         self.sampler_callback = StopSamplingCallback(self)
 
@@ -43,14 +43,12 @@ class PanelPymcApp(vu.UmbridgePanelApp):
 
     def reset_params(self):
         super().reset_params()
-        self.stepping = False
         self.start = None
         for k,v in self.reset_config().items():
             self.config[k] = v
 
     def reset(self, event):
         super().reset(event)
-        self.stepping = False
         self.start = None
         for k, v in self.sliders.items():
             v.value = self.config[k]
@@ -75,6 +73,7 @@ class PanelPymcApp(vu.UmbridgePanelApp):
             f"var_{i}": self.data_buffers[f"var_{i}"].buffer
             for i in range(self.input_dim)
         })
+        self.plots[0].title.text = f"N={self.n}"
 
     def setup_plots(self):
         sample_plot = plotting.figure(title="Samples", width=400, height=400)
@@ -83,11 +82,7 @@ class PanelPymcApp(vu.UmbridgePanelApp):
         self.plots += [sample_plot]
 
     def step(self):
-        if self.stepping:
-            return False
-
-        self.stepping = True
-
+        # runs in a worker thread, the plot sources are updated by update_plot_sources
         with pm.Model() as model:
             try:
                 posterior = pm.DensityDist('posterior', logp=self.op, shape=self.input_dim)
@@ -104,11 +99,9 @@ class PanelPymcApp(vu.UmbridgePanelApp):
 
                 self.start = trace.point(-1)
 
-                for points in trace.points():
-                    for i, point in enumerate(points['posterior']):
-                        self.data_buffers[f"var_{i}"].add(point)
-
-                self.update_plot_sources()
+                samples = trace.get_values('posterior')
+                for i in range(self.input_dim):
+                    self.data_buffers[f"var_{i}"].extend(samples[:, i])
 
             except pm.exceptions.SamplingError:
                 traceback.print_exc()
@@ -117,18 +110,8 @@ class PanelPymcApp(vu.UmbridgePanelApp):
             except Exception as e:
                 traceback.print_exc()
 
-            finally:
-                self.stepping = False
-
         return True
 
-    def stream(self):
-        if self.stepping:
-            return
-        status = super().stream()
-        if status:
-            self.plots[0].title.text = f"N={self.n}"        
-
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Umbridge Panel App.')
@@ -3,14 +3,14 @@
 import os
 import arviz as az
 import argparse
-import umbridge
+import viz_umbridge as vu
 import numpy as np
 import matplotlib.pyplot as plt
 
 import pymc as pm
 from pytensor import tensor as pt
 from pytensor.gradient import verify_grad # noqa: F401
-from umbridge.pymc import UmbridgeOp
+from viz_umbridge.pymc import UmbridgeOp
 
 # Change to directory of this script
 os.chdir(os.path.dirname(__file__))
@@ -23,11 +23,11 @@ args = parser.parse_args()
 print(f"Connecting to host URL {args.url}")
 
 # Print modelssupported by server
-print(umbridge.supported_models(args.url))
+print(vu.supported_models(args.url))
 
 # Set up an pytensor op connecting to UM-Bridge model
 config = {'m0': 0, 's0': 3, 'm1': 0}
-op = UmbridgeOp(args.url, "posterior", config=config)
+op = UmbridgeOp(args.url, "posterior", config=config, cache_size=1024, fused=True)
 
 print(op.umbridge_model.get_output_sizes())
 print(op.umbridge_model.get_input_sizes())
@@ -51,6 +51,7 @@ with pm.Model() as model:
 
     map_estimate = pm.find_MAP()
     print(f"MAP estimate of posterior is {map_estimate['posterior']}")
+    print(f"Model cache: {op.umbridge_model.hits} hits, {op.umbridge_model.misses} misses")
 
     inferencedata = pm.sample(tune=100,draws=400,cores=1)
     az.plot_pair(inferencedata)
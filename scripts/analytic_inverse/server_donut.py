@@ -14,41 +14,48 @@ class Donut(umbridge.Model):
     def __init__(self):
         super().__init__("posterior")
 
+    @staticmethod
+    def get_batch(config):
+        # config['batch'] points are stacked in the input, outputs are per point
+        return int(config.get('batch', 1))
+
     def get_input_sizes(self, config):
-        return [2]
+        return [2 * self.get_batch(config)]
 
     def get_output_sizes(self, config):
-        return [1]
+        # config['value_and_gradient'] adds the gradients as a second output
+        n = self.get_batch(config)
+        return [n, 2 * n] if config.get('value_and_gradient') else [n]
 
-    def __call__(self, parameters, config):
+    def value_and_gradient(self, parameters, config):
         sigma2 = config.get('sigma2', self.config.sigma2)
-        radius = config.get('radius', self.config.radius)                
-        r = np.linalg.norm(parameters[0])
-        return [[float(- (r - radius)**2 / sigma2) ]]
+        radius = config.get('radius', self.config.radius)
+        x = np.reshape(np.asarray(parameters[0], dtype=float), (self.get_batch(config), 2))
+        r = np.linalg.norm(x, axis=1)
+        value = - (r - radius)**2 / sigma2
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scale = np.where(r == 0, 0.0, (radius / r - 1) * 2 / sigma2)
+        return value, x * scale[:, None]
+
+    def __call__(self, parameters, config):
+        value, grad = self.value_and_gradient(parameters, config)
+        if config.get('value_and_gradient'):
+            return [value.tolist(), grad.ravel().tolist()]
+        return [value.tolist()]
 
     def supports_evaluate(self):
         return True
 
     def gradient(self, out_wrt, in_wrt, parameters, sens, config):
-        sigma2 = config.get('sigma2', self.config.sigma2)
-        radius = config.get('radius', self.config.radius)        
-        r = np.linalg.norm(parameters[0])
-        if (r == 0):
-            return [0,0]
-        return [float(sens[0] * parameters[0][0] * (radius / r - 1) * 2 / sigma2),
-                float(sens[0] * parameters[0][1] * (radius / r - 1) * 2 / sigma2)]
+        _, grad = self.value_and_gradient(parameters, config)
+        return (np.asarray(sens, dtype=float)[:, None] * grad).ravel().tolist()
 
     def supports_gradient(self):
         return True
 
     def apply_jacobian(self, out_wrt, in_wrt, parameters, vec, config):
-        sigma2 = config.get('sigma2', self.config.sigma2)
-        radius = config.get('radius', self.config.radius)
-        r = np.linalg.norm(parameters[0])
-        if (r == 0):
-            return [0]
-        return [float(vec[0] * parameters[0][0] * (radius / r - 1) * 2 / sigma2
-              + vec[1] * parameters[0][1] * (radius / r - 1) * 2 / sigma2)]
+        _, grad = self.value_and_gradient(parameters, config)
+        return np.sum(np.reshape(vec, grad.shape) * grad, axis=1).tolist()
 
     def supports_apply_jacobian(self):
         return True
@@ -19,45 +19,55 @@ class Funnel(umbridge.Model):
     def __init__(self):
         super().__init__("posterior")
 
+    @staticmethod
+    def get_batch(config):
+        # config['batch'] points are stacked in the input, outputs are per point
+        return int(config.get('batch', 1))
+
     def get_input_sizes(self, config):
-        return [2]
+        return [2 * self.get_batch(config)]
 
     def get_output_sizes(self, config):
-        return [1]
+        # config['value_and_gradient'] adds the gradients as a second output
+        n = self.get_batch(config)
+        return [n, 2 * n] if config.get('value_and_gradient') else [n]
 
-    def __call__(self, parameters, config):
+    def value_and_gradient(self, parameters, config):
         def f(x, m, s):
             return -0.5 * np.log(2 * np.pi) - np.log(s) - 0.5 * ((x-m)/s)**2
+        def dfdx(x, m, s):
+            return -(x-m) / (s**2)
+        def dfds(x, m, s):
+            return ((x-m)**2 - (s**2)) / (s**3)
         m0 = config.get("m0", self.config.m0)
         s0 = config.get("s0", self.config.s0)
         m1 = config.get("m1", self.config.m1)
-        s1 = np.exp(parameters[0][0] / 2)
-        return [[ float(f(parameters[0][0], m0, s0) + f(parameters[0][1], m1, s1)) ]]
+        x = np.reshape(np.asarray(parameters[0], dtype=float), (self.get_batch(config), 2))
+        x0, x1 = x[:, 0], x[:, 1]
+        s1 = np.exp(x0 / 2)
+        value = f(x0, m0, s0) + f(x1, m1, s1)
+        grad = np.column_stack([dfdx(x0, m0, s0) + .5 * s1 * dfds(x1, m1, s1), dfdx(x1, m1, s1)])
+        return value, grad
+
+    def __call__(self, parameters, config):
+        value, grad = self.value_and_gradient(parameters, config)
+        if config.get('value_and_gradient'):
+            return [value.tolist(), grad.ravel().tolist()]
+        return [value.tolist()]
 
     def supports_evaluate(self):
         return True
 
     def gradient(self, out_wrt, in_wrt, parameters, sens, config):
-        return [float(self.apply_jacobian(out_wrt, in_wrt, parameters, [sens[0], 0], config)[0]),
-                float(self.apply_jacobian(out_wrt, in_wrt, parameters, [0, sens[0]], config)[0])]
+        _, grad = self.value_and_gradient(parameters, config)
+        return (np.asarray(sens, dtype=float)[:, None] * grad).ravel().tolist()
 
     def supports_gradient(self):
         return True
 
     def apply_jacobian(self, out_wrt, in_wrt, parameters, vec, config):
-        def f(x, m, s):
-            return -0.5 * np.log(2 * np.pi) - np.log(s) - 0.5 * ((x-m)/s)**2
-        def dfdx(x, m, s):
-            return -(x-m) / (s**2)
-        def dfds(x, m, s):
-            return ((x-m)**2 - (s**2)) / (s**3)
-        m0 = config.get("m0", self.config.m0)
-        s0 = config.get("s0", self.config.s0)
-        m1 = config.get("m1", self.config.m1)
-        s1 = np.exp(parameters[0][0] / 2)
-
-        return [float(vec[1] * dfdx(parameters[0][1], m1, s1)
-              + vec[0] * (dfdx(parameters[0][0], m0, s0) + .5 * s1 * dfds(parameters[0][1], m1, s1)))]
+        _, grad = self.value_and_gradient(parameters, config)
+        return np.sum(np.reshape(vec, grad.shape) * grad, axis=1).tolist()
 
     def supports_apply_jacobian(self):
         return True
@@ -3,7 +3,6 @@ https://um-bridge-benchmarks.readthedocs.io/en/docs/inverse-benchmarks/deconvolu
 """
 import traceback
 import argparse
-import umbridge
 import pymc as pm
 import numpy as np
 import panel as pn
@@ -11,7 +10,7 @@ from pytensor import tensor as pt
 from bokeh import models
 from bokeh import plotting
 import viz_umbridge as vu
-from umbridge.pymc import UmbridgeOp
+from viz_umbridge.pymc import UmbridgeOp
 
 class StopSamplingCallback(pm.callbacks.Callback):
     def __init__(self, app):
@@ -29,7 +28,7 @@ class PanelPymcApp(vu.UmbridgePanelApp):
 
     def __init__(self, url, model_name="posterior", reset_config=None):
 
-        super().__init__(url, '1D Deconvolution', model_name)
+        super().__init__(url, '1D Deconvolution', model_name, asynchronous=True)
         
         self.config = {}
         self.reset_params()
@@ -44,26 +43,24 @@ class PanelPymcApp(vu.UmbridgePanelApp):
 
     @pn.cache
     def get_solution(self):
-        return umbridge.HTTPModel(self.url, "Deconvolution1D_ExactSolution")([[]])[0]
+        return vu.HTTPModel(self.url, "Deconvolution1D_ExactSolution")([[]])[0]
 
     def set_op(self):
         # Set up an pytensor op connecting to UM-Bridge model
-        self.op = UmbridgeOp(self.url, self.select.value)        
+        self.op = UmbridgeOp(self.url, self.select.value, cache_size=1024)
 
     def reset_params(self):
         super().reset_params()
-        self.stepping = False
         self.start = None
         for k,v in reset_config().items():
             self.config[k] = v
         if hasattr(self, 'select'):
-            self.op = UmbridgeOp(self.url, self.select.value, config=self.config)
+            self.op = UmbridgeOp(self.url, self.select.value, config=self.config, cache_size=1024)
         else:
-            self.op = UmbridgeOp(self.url, 'Deconvolution1D_Gaussian', config=self.config)
+            self.op = UmbridgeOp(self.url, 'Deconvolution1D_Gaussian', config=self.config, cache_size=1024)
 
     def reset(self, event):
         super().reset(event)
-        self.stepping = False
         self.start = None
         self.initialize_buffers()
         for k, v in self.sliders.items():
@@ -82,7 +79,7 @@ class PanelPymcApp(vu.UmbridgePanelApp):
     def initialize_widgets(self):
         super().initialize_widgets()
 
-        menu_items = umbridge.supported_models(args.url)
+        menu_items = vu.supported_models(args.url)
         self.select = pn.widgets.Select(name='Select', options=menu_items)
         self.sliders['prior'] = self.select
 
@@ -93,18 +90,24 @@ class PanelPymcApp(vu.UmbridgePanelApp):
             self.sliders[f'{key}'] = slider
 
     def initialize_buffers(self, buffer_size=1000):
-        self.buffer = vu.FixedSizeObjectBuffer(buffer_size, placeholder=np.full(self.input_dim, np.nan))
+        # posterior bands are maintained as draws enter and leave the buffer
+        self.moments = vu.WindowedMoments()
+        self.quantiles = vu.StreamingHistogram()
+        self.buffer = vu.FixedSizeArrayBuffer(buffer_size, self.input_dim, accumulators=[self.moments, self.quantiles])
 
     def initialize_plot_sources(self):
         self.plot_source = models.ColumnDataSource({"x": np.arange(self.input_dim), "mean": np.zeros(self.input_dim), 
                                                     "lower": np.zeros(self.input_dim), "upper": np.zeros(self.input_dim)})
 
-    def step(self):
-        if self.stepping:
-            return False
-
-        self.stepping = True
+    def update_plot_sources(self):
+        if self.moments.count is None or not np.any(self.moments.count):
+            return  # no draws yet, the bands are undefined
+        self.plot_source.data.update({'mean': self.moments.mean, 
+                                      'lower': self.quantiles.quantile(0.025),
+                                      'upper': self.quantiles.quantile(0.975)})
 
+    def step(self):
+        # runs in a worker thread, the plot sources are updated by update_plot_sources
         with pm.Model() as model:
             try:
                 posterior = pm.DensityDist('posterior', logp=self.op, shape=self.input_dim)
@@ -121,13 +124,8 @@ class PanelPymcApp(vu.UmbridgePanelApp):
 
                 self.start = trace.point(-1)
 
-                for points in trace.points():
-                    self.buffer.add(points['posterior'])
-
-                traces = np.array(self.buffer.buffer)
-                self.plot_source.data.update({'mean': np.nanmean(traces, axis=0), 
-                                              'lower': np.nanpercentile(traces, 2.5, axis=0),
-                                              'upper': np.nanpercentile(traces, 97.5, axis=0)})
+                self.buffer.extend(trace.get_values('posterior'))
+                return True
 
             except pm.exceptions.SamplingError:
                 traceback.print_exc()
@@ -136,10 +134,7 @@ class PanelPymcApp(vu.UmbridgePanelApp):
             except Exception as e:
                 traceback.print_exc()
 
-            finally:
-                self.stepping = False
-
-        return True        
+        return False # nothing new to draw
 
 
 if __name__ == "__main__":
@@ -8,13 +8,13 @@ References
 import os
 import arviz as az
 import argparse
-import umbridge
+import viz_umbridge as vu
 import numpy as np
 import matplotlib.pyplot as plt
 import pymc as pm
 from pytensor import tensor as pt
 from pytensor.gradient import verify_grad # noqa: F401
-from umbridge.pymc import UmbridgeOp
+from viz_umbridge.pymc import UmbridgeOp
 
 
 # Change to directory of this script
@@ -29,13 +29,13 @@ args = parser.parse_args()
 print(f"Connecting to host URL {args.url}")
 
 # Print models supported by server
-print(umbridge.supported_models(args.url))
+print(vu.supported_models(args.url))
 
 # Get the exact solution
-sol = umbridge.HTTPModel(args.url, "Deconvolution1D_ExactSolution")([[]])
+sol = vu.HTTPModel(args.url, "Deconvolution1D_ExactSolution")([[]])
 
 # Set up an pytensor op connecting to UM-Bridge model
-op = UmbridgeOp(args.url, "Deconvolution1D_Gaussian")
+op = UmbridgeOp(args.url, "Deconvolution1D_Gaussian", fused=True)
 
 # Define input parameter
 input_dim = len(sol[0])
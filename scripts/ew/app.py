@@ -1,21 +1,23 @@
 import os
+import uuid
+import threading
+import traceback
 import argparse
 import numpy as np
 import pandas as pd
 import panel as pn
-from collections import deque
 from bokeh import models
 from bokeh import plotting
 import viz_umbridge as vu
-import umbridge
 from bokeh.palettes import Reds256
 
-from laser_model.england_wales.scenario import get_scenario
 from laser_model.england_wales.params import get_parameters
+from scenario_store import get_scenario
 
 class EWApp(vu.UmbridgePanelApp):
     def __init__(self, url, model_name="forward"):
-        super().__init__(url, 'England&Wales Measles', model_name)
+        super().__init__(url, 'England&Wales Measles', model_name,
+                         pipeline=True, drop_policy="block")
 
         self.config = {}
         self.n_nodes: int = None
@@ -25,7 +27,12 @@ class EWApp(vu.UmbridgePanelApp):
                            'distance_exponent':{'start':1.0, 'end':2.0, 'step':0.1}}
         self.reset_params()
 
-        self.umbridge_model =  umbridge.HTTPModel(url, "forward")
+        self.umbridge_model =  vu.HTTPModel(url, "forward")
+        self.session_id = uuid.uuid4().hex # own simulation on a shared server
+        self.command = {} # snapshot/restore sent with the next request
+        self.command_lock = threading.Lock() # set by the UI, taken by the producer thread
+        # ask for float32 words instead of JSON floats if the server supports it
+        self.encoding = 'float32' if vu.supports_float32(self.umbridge_model) else None
 
         self.initialize_plot_sources()
         self.initialize_buffers()
@@ -35,16 +42,23 @@ class EWApp(vu.UmbridgePanelApp):
 
     def reset(self, event):
         super().reset(event)
-        self.umbridge_model([[]], config={'reset': True})
+        self.umbridge_model([[]], config={'reset': True, 'session_id': self.session_id})
+        self.slider_ticks.value = self.ticks_per_request
         for k, v in self.sliders.items():
             if k in self.config:
                 v.value = self.config[k]        
-        self.time_ts_list.clear()
-        self.prev_ts_list.clear()        
+        self.time_buffer.clear()
+        self.prev_buffer.clear()
+        self.ts_updater.reset()
+        self.reset_wave()
+        self.plot_wave_source.data.update({'x': [], 'y': []})
 
     def reset_params(self):
         super().reset_params()
         self.wave_radius = 30
+        self.wave_period = 1 # ticks between wave plot updates
+        self.wave_n = 0 # tick of the last wave plot update
+        self.ticks_per_request = 1 # ticks the server runs per request
         self.callback_period = 50
         for p in self.param_dict.keys():
             self.config[p] = get_parameters({})[p]
@@ -59,6 +73,20 @@ class EWApp(vu.UmbridgePanelApp):
             name="start/stop wave", value=False, button_type="default"
         )     
 
+        self.slider_ticks = pn.widgets.IntSlider(
+            value=self.ticks_per_request, start=1, end=52, name="Ticks per Request"
+        )
+        self.slider_ticks.param.watch(self.on_ticks_change, 'value')
+
+        # named server checkpoints, e.g. to jump back to a burnt-in state; private to this
+        # session unless shared, which other apps on the server can then restore or overwrite
+        self.checkpoint_input = pn.widgets.TextInput(name="Checkpoint", value="warm")
+        self.shared_checkbox = pn.widgets.Checkbox(name="Shared with other sessions", value=False)
+        self.snapshot_button = pn.widgets.Button(name="Save State")
+        self.snapshot_button.on_click(lambda event: self.send_checkpoint('snapshot'))
+        self.restore_button = pn.widgets.Button(name="Restore State")
+        self.restore_button.on_click(lambda event: self.send_checkpoint('restore'))
+
         for key, value in self.config.items():
             slider = pn.widgets.FloatSlider(name=key, value=value, **self.param_dict[key])
             setattr(self, f'on_{key}_change', lambda event, key=key: self.config.update({key: event.new}))
@@ -66,6 +94,32 @@ class EWApp(vu.UmbridgePanelApp):
             self.sliders[f'{key}'] = slider
 
 
+    def send_checkpoint(self, action):
+        with self.command_lock:
+            self.command.update({action: self.checkpoint_input.value, 'shared_checkpoint': self.shared_checkbox.value})
+        if not self.pause_button.value:
+            self.send_command() # paused, no producer picks it up
+
+    def send_command(self):
+        """
+        Run one request with the pending command on the UI thread while the
+        producer is stopped, after the results it has already queued.
+        """
+        if not self.join_producer(self.RESET_TIMEOUT):
+            return # still evaluating, the command waits for the next run
+        results = self.drain_queue()
+        try:
+            results.append(self.evaluate())
+        except Exception:
+            traceback.print_exc()
+        if results:
+            self.n += self.consume(results)
+            self.stale = True
+            self.render(force=True)
+
+    def on_ticks_change(self, event):
+        self.ticks_per_request = event.new
+
     def initialize_plot_sources(self):
         scenario = get_scenario()
         self.plot_node_source = models.ColumnDataSource({
@@ -81,7 +135,7 @@ class EWApp(vu.UmbridgePanelApp):
             "x": [],
             "y": []
         })
-        self.ts_source = models.ColumnDataSource({"time": np.arange(0, 10 * 26), "prevalence": np.zeros(10 * 26)})
+        self.ts_source = models.ColumnDataSource({"time": [], "prevalence": []})
         self.n_nodes = len(scenario)
 
     def setup_plots(self):
@@ -113,56 +167,82 @@ class EWApp(vu.UmbridgePanelApp):
         prev_ts.line(x="time", y="prevalence", source=self.ts_source, color="red") 
         self.plots += [prev_ts]     
 
-    def step(self):
-        # increment the step counter
-        self.n += 1
-
-        # steps the UMBridge model        
-        res = self.umbridge_model([[]], config=self.config)
+    def evaluate(self):
+        # steps the UMBridge model (runs in the producer thread), possibly several ticks at once
+        config = dict(self.config, nsteps=self.ticks_per_request, record_every=1, session_id=self.session_id)
+        if self.encoding is not None:
+            config['encoding'] = self.encoding
+        with self.command_lock:
+            command, self.command = self.command, {}
+        config.update(command)
+        try:
+            outputs = self.umbridge_model([[]], config=config)
+        except Exception:
+            with self.command_lock:
+                self.command = {**command, **self.command} # send it again with the next request
+            # the server drops sessions idle for longer than its timeout and refuses them until reset
+            print("Request failed, press Reset if the server session expired")
+            raise
+        prevalence, cases, total = vu.decode_outputs(outputs, self.encoding)
+        # (ticks x nodes) blocks; a server without nsteps support returns a single tick
+        return prevalence.reshape(len(total), -1), cases.reshape(len(total), -1), total, 'restore' in command
+
+    def consume(self, results):
+        # every tick goes into the buffers, only the last one is drawn on the map
+        cases = np.concatenate([res[1] for res in results])
+        total = np.concatenate([res[2] for res in results])
+        for _, block, _, restored in results:
+            if restored:
+                self.reset_wave() # the window would mix in the trajectory before the restore
+            self.wave_transform.update(block[:, self.wave_nodes])
+        self.time_buffer.extend(np.arange(self.n + 1, self.n + len(total) + 1) / 26.0)
+        self.prev_buffer.extend(100 * total)  # (prev in %)
+        self.result = (results[-1][0][-1], results[-1][1][-1])
+        return len(total)
+
+    def update_plot_sources(self):
+        res = self.result
 
         # update the plot sources
-        self.plot_node_source.data.update({'prevalence': res[0]})
-        self.plot_node_source.data.update({'cases': res[1]})
-        self.wave_buffer.add(res[1])
-
-        self.time_ts_list.append(self.n / 26.0)
-        self.prev_ts_list.append(100 * res[2][0])  # (prev in %)        
-        self.ts_source.data = {"time": list(self.time_ts_list), "prevalence": list(self.prev_ts_list)}
+        self.plot_node_source.data.update({'prevalence': vu.as_column(res[0]), 'cases': vu.as_column(res[1])})
+        self.ts_updater.update()
+        self.plots[0].title.text = f"N={self.n}"
 
-        if self.wave_button.value & (self.n % 26 == 0):
+        if self.wave_button.value & (self.n - self.wave_n >= self.wave_period):
+            self.wave_n = self.n
             self.calculate_wave('London', self.wave_radius)
 
-    def stream(self):
-        super().stream()
-        self.plots[0].title.text = f"N={self.tick}"
-
-    def initialize_buffers(self, buffer_size:int = 26*4):
-        self.time_ts_list = deque()
-        self.prev_ts_list = deque()
-        self.wave_buffer = vu.FixedSizeObjectBuffer(buffer_size, placeholder=self.n_nodes*[0])
-
+    def initialize_buffers(self, buffer_size:int = 26*4, ts_size:int = 26*50):
+        self.time_buffer = vu.FixedSizeFloatBuffer(ts_size)
+        self.prev_buffer = vu.FixedSizeFloatBuffer(ts_size)
+        # the time series is streamed to the browser, which drops rows older than ts_size ticks
+        self.ts_updater = vu.BufferSource(
+            self.ts_source, {"time": self.time_buffer, "prevalence": self.prev_buffer}, mode="stream"
+        )
+        self.wave_size = buffer_size
+        self.wave_nodes = self.get_wave_nodes('London', self.wave_radius)
+        self.reset_wave()
+
+    def reset_wave(self):
+        # incremental wavelet transform of the reference (first) and the nodes within the wave radius
+        self.wave_transform = vu.measles.StreamingWaveletTransform(
+            self.wave_size, len(self.wave_nodes), vu.measles.band_widths(1 / (3 * 26), 1/(1.5 * 26))
+        )
 
-    def calculate_wave(self, ref, radius):
+    def get_wave_nodes(self, ref, radius):
         data = pd.DataFrame(self.plot_node_source.data)
         data.reset_index(inplace=True)
-        cases = np.array(self.wave_buffer.buffer)
-        ref_cwt, _ = vu.measles.calc_Ws(cases[:, data[data.name == ref].index].flatten())
-        # ref_cwt = np.conjugate(ref_cwt)
         distances = self.calculate_distances(ref)
-        ind = np.nonzero(distances < radius)[0]
-        x = np.zeros(len(ind))
-        y = np.zeros(len(ind))
-        for cnt, i in enumerate(ind):
-            row = data.loc[i]
-            distance = distances.iloc[i]
-            if row.name == ref:
-                continue
-            cwt, frequencies = vu.measles.calc_Ws(cases[:, i].flatten())
-            diff = ref_cwt*np.conj(cwt)
-            ind = np.where(np.logical_and(frequencies < 1/(1.5 * 26), frequencies > 1 / (3 * 26)))            
-            diff = diff[ind[0], :]
-            x[cnt] = distance
-            y[cnt] = np.angle(np.mean(diff))
+        ref_index = data[data.name == ref].index[0]
+        nearby = np.nonzero(distances.values < radius)[0]
+        return np.concatenate(([ref_index], nearby[nearby != ref_index]))
+
+    def calculate_wave(self, ref, radius):
+        # the streaming transform already holds the window for self.wave_nodes
+        distances = self.calculate_distances(ref)
+        phases = self.wave_transform.phase_diffs(0)
+        x = distances.iloc[self.wave_nodes[1:]].values
+        y = -phases[1:] # phase of the reference relative to each node
         self.plot_wave_source.data.update({'x': x, 'y': y})
 
     @pn.cache
@@ -181,8 +261,13 @@ class EWApp(vu.UmbridgePanelApp):
                 pn.layout.Divider(),
                 "### Playback Controls",
                 self.slider_speed,
+                self.slider_ticks,
                 pn.Row(self.reset_button, self.pause_button),
                 self.wave_button, 
+                pn.layout.Divider(),
+                self.checkpoint_input,
+                self.shared_checkbox,
+                pn.Row(self.snapshot_button, self.restore_button),
             ]
         )
         sliders = pn.Column(*sliders)
@@ -206,7 +291,7 @@ if __name__ == "__main__":
     args = parser.parse_args()
 
     print(f"Connecting to host URL {args.url}")
-    print(umbridge.supported_models(args.url))
+    print(vu.supported_models(args.url))
 
     app = EWApp(args.url)
 
@@ -15,8 +15,8 @@ from bokeh.palettes import diverging_palette
 
 from laser_model.england_wales.model import EnglandWalesModel
 from laser_model.england_wales.params import get_parameters
-from laser_model.england_wales.scenario import get_scenario
-from laser_model.mixing import init_gravity_diffusion
+from scenario_store import get_scenario
+from mixing_cache import MixingCache
 
 PRIMARY_COLOR = "#0072B5"
 SECONDARY_COLOR = "#B54300"
@@ -28,11 +28,11 @@ params = get_parameters({})
 scenario = get_scenario()
 model = EnglandWalesModel(parameters=params, scenario=scenario)
 model.run()
+mixing = MixingCache(scenario)
 
 # reset functions
 
-# memoize the function (https://panel.holoviz.org/how_to/caching/memoization.html)
-@pn.cache
+# the scenario store parses the scenario once per process
 def get_data():
     return get_scenario()
 
@@ -90,7 +90,7 @@ mixing_scale_slider = pn.widgets.FloatSlider(value=np.log10(params.mixing_scale)
 
 def on_mixing_scale_change(value):
     params.mixing_scale = np.power(10, value)
-    params.mixing = init_gravity_diffusion(scenario, params.mixing_scale, params.distance_exponent)
+    params.mixing = mixing(params.mixing_scale, params.distance_exponent)
 
 
 bound_mixing_scale = pn.bind(on_mixing_scale_change, value=mixing_scale_slider)
@@ -100,7 +100,7 @@ distance_exponent_slider = pn.widgets.FloatSlider(value=params.distance_exponent
 
 def on_distance_exponent_change(value):
     params.distance_exponent = value
-    params.mixing = init_gravity_diffusion(scenario, params.mixing_scale, params.distance_exponent)
+    params.mixing = mixing(params.mixing_scale, params.distance_exponent)
 
 
 bound_distance_exponent = pn.bind(on_distance_exponent_change, value=distance_exponent_slider)
@@ -0,0 +1,95 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from laser_model.england_wales.model import EnglandWalesModel
+from laser_model.england_wales.params import get_parameters
+from viz_umbridge import measles
+from mixing_cache import MixingCache
+from scenario_store import get_scenario, get_store
+
+# swept parameters, mixing_scale as log10 like the app sliders
+PARAMETERS = ("beta", "seasonality", "mixing_scale", "distance_exponent")
+REF_CITY = "London"
+TICKS_PER_YEAR = 26
+DEG2KM = 111.32
+
+_mixing = None # per worker process
+
+def _distances(ref):
+    columns = get_store().columns
+    j = list(get_store().names).index(ref)
+    lon, lat = np.asarray(columns["Long"]), np.asarray(columns["Lat"])
+    return j, np.sqrt((lon - lon[j])**2 + (lat - lat[j])**2) * DEG2KM
+
+def run_trajectory(values, nticks, burnin=0):
+    """
+    Run one trajectory of the England & Wales model.
+
+    Args:
+        values (array_like): Parameter values in the order of PARAMETERS.
+        nticks (int): Ticks to run (bi-weeks).
+        burnin (int): Leading ticks left out of the summaries.
+
+    Returns:
+        tuple: Total prevalence per recorded tick, and the (slope, slope se)
+        of the phase difference from London (degrees/km) over the nodes.
+    """
+    global _mixing
+    if _mixing is None:
+        _mixing = MixingCache(get_scenario(), maxsize=1) # random parameters, nothing to reuse
+    params = dict(zip(PARAMETERS, values))
+    model = EnglandWalesModel(parameters=get_parameters({}), scenario=get_scenario())
+    model.metrics = []
+    for p, v in params.items():
+        model.params[p] = np.power(10, v) if p == 'mixing_scale' else v
+    model.params['mixing'] = _mixing(model.params.mixing_scale, model.params.distance_exponent)
+
+    cases = np.zeros((nticks - burnin, len(model.nodes)))
+    prevalence = np.zeros(nticks - burnin)
+    for tick in range(nticks):
+        model.step(tick)
+        if tick >= burnin:
+            states = model.nodes.states
+            cases[tick - burnin] = states[1]
+            prevalence[tick - burnin] = states[1].sum() / states.sum()
+
+    # travelling wave from London, as in viz_umbridge.measles.main (bi-weekly data)
+    j, distances = _distances(REF_CITY)
+    phases = measles.calc_phase_diffs(cases, j, 1 / (3 * TICKS_PER_YEAR), 1 / (1.5 * TICKS_PER_YEAR))
+    others = np.arange(len(distances)) != j
+    p, pe = measles.phase_slope(distances[others], phases[others])
+    return prevalence, (p[1], pe[1])
+
+def make_executor(max_workers=None):
+    """Process pool for run_ensemble (spawned workers, safe to start from a threaded server)."""
+    return ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(),
+                               mp_context=multiprocessing.get_context("spawn"))
+
+def run_ensemble(param_sets, nticks, burnin=0, executor=None):
+    """
+    Run one trajectory per parameter set in a process pool.
+
+    Args:
+        param_sets (array_like): (runs x len(PARAMETERS)) parameter values.
+        executor (Executor): Pool to use, a new one of make_executor() by default.
+
+    Returns:
+        dict: Stacked 'parameters' (runs x parameters), 'prevalence'
+        (runs x ticks), 'slope' and 'slope_se' (runs,).
+    """
+    param_sets = np.atleast_2d(np.asarray(param_sets, dtype=float))
+    own = executor is None
+    executor = make_executor() if own else executor
+    try:
+        results = list(executor.map(run_trajectory, param_sets,
+                                    [nticks] * len(param_sets), [burnin] * len(param_sets)))
+    finally:
+        if own:
+            executor.shutdown()
+    return {
+        "parameters": param_sets,
+        "prevalence": np.array([r[0] for r in results]),
+        "slope": np.array([r[1][0] for r in results]),
+        "slope_se": np.array([r[1][1] for r in results]),
+    }
@@ -0,0 +1,67 @@
+from collections import OrderedDict
+import numpy as np
+from scenario_store import get_scenario
+
+EARTH_RADIUS = 6371.0 # km
+MIN_DISTANCE = 10 # km added to every distance, keeps neighbouring nodes from dominating
+# positions of the app sliders: 5 log10(mixing_scale) x 11 distance_exponent values
+SLIDER_GRID = 5 * 11
+
+class MixingCache:
+    """
+    LRU cache of gravity diffusion mixing matrices for one scenario.
+
+    Builds the same matrix as laser_model.mixing.init_gravity_diffusion:
+    node i sends to node j in proportion to population_j / (d_ij + 10 km)^e,
+    the off-diagonal rates are normalized to a mean row sum of mixing_scale
+    and the diagonal keeps the rest. The log distances and the populations
+    are computed once, so a new (mixing_scale, distance_exponent) pair costs
+    one vectorized power-and-scale pass, and a pair seen before a dict lookup.
+    The default size holds every position of the app sliders; each entry is
+    a dense (nodes x nodes) float64 matrix.
+
+    Attributes:
+        scenario (pd.DataFrame): Scenario the matrices are built for.
+        populations (np.ndarray): Population of each node.
+        log_distances (np.ndarray): log(d_ij + MIN_DISTANCE), great-circle distances in km.
+        maxsize (int): Number of matrices kept.
+        hits (int): Number of lookups answered from the cache.
+        misses (int): Number of matrices built.
+    """
+
+    def __init__(self, scenario=None, maxsize=SLIDER_GRID):
+        self.scenario = get_scenario() if scenario is None else scenario
+        self.populations = np.asarray(self.scenario["population"], dtype=np.float64)
+        lat = np.radians(np.asarray(self.scenario["Lat"], dtype=np.float64))
+        lon = np.radians(np.asarray(self.scenario["Long"], dtype=np.float64))
+        h = np.sin((lat[:, None] - lat) / 2)**2 + np.cos(lat[:, None]) * np.cos(lat) * np.sin((lon[:, None] - lon) / 2)**2
+        self.log_distances = np.log(2 * EARTH_RADIUS * np.arcsin(np.sqrt(h)) + MIN_DISTANCE)
+        self.maxsize = maxsize
+        self.matrices = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def build(self, mixing_scale, distance_exponent):
+        """Mixing matrix for the parameters, without the cache."""
+        if len(self.populations) == 1:
+            return np.ones((1, 1))
+        weights = np.exp(-distance_exponent * self.log_distances)
+        weights *= self.populations
+        np.fill_diagonal(weights, 0)
+        weights *= mixing_scale / weights.sum(axis=1).mean()
+        np.fill_diagonal(weights, 1 - weights.sum(axis=1))
+        return weights
+
+    def __call__(self, mixing_scale, distance_exponent):
+        """Mixing matrix for the parameters."""
+        key = (float(mixing_scale), float(distance_exponent))
+        if key in self.matrices:
+            self.hits += 1
+            self.matrices.move_to_end(key)
+            return self.matrices[key]
+        self.misses += 1
+        matrix = self.build(*key)
+        self.matrices[key] = matrix
+        if len(self.matrices) > self.maxsize:
+            self.matrices.popitem(last=False)
+        return matrix
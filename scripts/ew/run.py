@@ -1,52 +1,77 @@
+"""
+Parameter sweep of the England & Wales model: runs trajectories for random
+parameter sets in a process pool and saves the stacked summaries.
+
+    python run.py --runs 64 --nticks 520 --burnin 260 --out sweep.npz
+"""
 import os
+import argparse
+import numpy as np
 import matplotlib.pyplot as plt
-from laser_core.laserframe import LaserFrame
-from matplotlib.figure import Figure
-
-from laser_model.base import BaseComponent
-from laser_model.england_wales.model import EnglandWalesModel
-from laser_model.england_wales.params import get_parameters
-from laser_model.england_wales.scenario import get_scenario
-
-os.chdir(os.path.dirname(__file__))
-
-class TotalInfectiousReporter(BaseComponent):
-    def __init__(self, model, verbose: bool = False) -> None:
-        super().__init__(model, verbose)
-        print("Initializing the infectious reporter")
-
-        # add the infectious counter
-        if not hasattr(model, "reports"):
-            model.reports = LaserFrame(1)
-        model.reports.add_vector_property("infectious", length=model.params.nticks)
 
-    def __call__(self, model, tick):
-        # count the infecteds
-        model.reports.infectious[tick] = model.nodes.states[1].sum()
+import viz_umbridge as vu
+import ensemble
 
-        return
+# same ranges as the sliders of app.py
+RANGES = {
+    "beta": (0, 50),
+    "seasonality": (0, 0.3),
+    "mixing_scale": (-4, -2),  # log10
+    "distance_exponent": (1.0, 2.0),
+}
 
-    def plot(self, fig: Figure = None):
-        _fig = plt.figure(dpi=128) if fig is None else fig
-        plt.plot(self.model.reports.infectious)
-        plt.title("Infectious")
-        plt.xlabel("Time (Bi-weekly)")
-        yield
-        return
+def run_stored(param_sets, nticks, burnin, executor, store):
+    """run_ensemble, skipping the parameter sets already in the EvaluationStore."""
+    config = {"nticks": nticks, "burnin": burnin}
+    stored = store.get_many("ew_trajectory", [[list(values)] for values in param_sets], config)
+    todo = [i for i, output in enumerate(stored) if output is None]
+    if todo:
+        result = ensemble.run_ensemble(param_sets[todo], nticks, burnin, executor=executor)
+        for k, i in enumerate(todo):
+            stored[i] = [result["prevalence"][k].tolist(), [result["slope"][k], result["slope_se"][k]]]
+        store.put_many("ew_trajectory", [[list(param_sets[i])] for i in todo], [stored[i] for i in todo], config)
+    print(f"{len(param_sets) - len(todo)} of {len(param_sets)} runs taken from {store.path}")
+    return {
+        "parameters": param_sets,
+        "prevalence": np.array([output[0] for output in stored]),
+        "slope": np.array([output[1][0] for output in stored]),
+        "slope_se": np.array([output[1][1] for output in stored]),
+    }
 
+def sample_parameters(n_runs, seed=None):
+    rng = np.random.default_rng(seed)
+    low, high = np.array([RANGES[p] for p in ensemble.PARAMETERS]).T
+    return low + (high - low) * rng.random((n_runs, len(ensemble.PARAMETERS)))
 
-# setup the model
-scenario = get_scenario()
-parameters = get_parameters({})
-model = EnglandWalesModel(scenario, parameters)
+if __name__ == "__main__":
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
-# add the reporter
-model.components += [TotalInfectiousReporter]
+    parser = argparse.ArgumentParser(description='England & Wales parameter sweep.')
+    parser.add_argument('--runs', type=int, default=os.cpu_count(), help='number of parameter sets')
+    parser.add_argument('--nticks', type=int, default=20 * ensemble.TICKS_PER_YEAR, help='ticks per run (bi-weeks)')
+    parser.add_argument('--burnin', type=int, default=0, help='leading ticks left out of the summaries')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--out', type=str, default='sweep.npz')
+    parser.add_argument('--store', type=str, default=None, help='SQLite file of stored runs to reuse (e.g. with the same --seed)')
+    parser.add_argument('--plot', action='store_true', help='plot the prevalence time series')
+    args = parser.parse_args()
 
-# and run
-model.run()
+    param_sets = sample_parameters(args.runs, args.seed)
+    with ensemble.make_executor(args.workers) as executor:
+        if args.store:
+            result = run_stored(param_sets, args.nticks, args.burnin, executor, vu.EvaluationStore(args.store))
+        else:
+            result = ensemble.run_ensemble(param_sets, args.nticks, args.burnin, executor=executor)
+    np.savez(args.out, names=np.array(ensemble.PARAMETERS), **result)
 
-# visualize the results
-model.visualize(pdf=False)
+    for values, slope, se in zip(result["parameters"], result["slope"], result["slope_se"]):
+        print(", ".join(f"{p}={v:.3g}" for p, v in zip(ensemble.PARAMETERS, values)), f"-> slope {slope:.3g} ± {se:.2g} deg/km")
+    print(f"saved {args.out}")
 
-print("done")
\ No newline at end of file
+    if args.plot:
+        time = (args.burnin + np.arange(result["prevalence"].shape[1])) / ensemble.TICKS_PER_YEAR
+        plt.plot(time, 100 * result["prevalence"].T, alpha=0.5)
+        plt.xlabel("Time (years)")
+        plt.ylabel("Prevalence (%)")
+        plt.show()
@@ -0,0 +1,118 @@
+import os
+import json
+import shutil
+import functools
+import tempfile
+import numpy as np
+import pandas as pd
+from laser_model.england_wales import scenario as _scenario
+
+CACHE_DIR = os.environ.get(
+    "EW_SCENARIO_CACHE", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".scenario_cache")
+)
+
+def _version():
+    try:
+        from importlib.metadata import version
+        return version("laser-cohorts")
+    except Exception:
+        return "unknown"
+
+class ScenarioStore:
+    """
+    Process-wide England & Wales scenario, parsed once.
+
+    The columns are written to `cache_dir` as .npy files on first use and
+    memory-mapped read-only afterwards, so later processes skip the parsing
+    and share the pages of the cache files. The cache is rebuilt when the
+    laser-cohorts version changes. Scenarios with columns that can't be
+    stored as plain arrays are kept in memory only.
+
+    Attributes:
+        columns (dict): Column name -> read-only np.ndarray.
+        names (np.ndarray): Node names (the scenario index).
+        frame (pd.DataFrame): The scenario as returned by get_scenario(), built
+            once and shared by every model in the process; do not modify.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        loaded = self._load() if cache_dir else None
+        if loaded is None:
+            frame = _scenario.get_scenario()
+            loaded = self._save(frame) if cache_dir else None
+            if loaded is None:
+                loaded = self._from_frame(frame)
+        self.names, self.columns, index_name = loaded
+        # copy=False keeps the read-only (memory-mapped) columns instead of copying them into a block
+        self.frame = pd.DataFrame(dict(self.columns), index=pd.Index(self.names, name=index_name), copy=False)
+
+    @staticmethod
+    def _from_frame(frame):
+        columns = {}
+        for name in frame.columns:
+            values = np.array(frame[name].values)
+            values.flags.writeable = False
+            columns[name] = values
+        names = np.array(frame.index.values)
+        names.flags.writeable = False
+        return names, columns, frame.index.name
+
+    def _meta_path(self, root=None):
+        return os.path.join(root or self.cache_dir, "meta.json")
+
+    def _load(self):
+        try:
+            with open(self._meta_path()) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get("version") != _version():
+            return None
+        def load(name):
+            return np.load(os.path.join(self.cache_dir, f"{name}.npy"), mmap_mode="r")
+        try:
+            columns = {name: load(f"col{i}") for i, name in enumerate(meta["columns"])}
+            return load("index"), columns, meta["index_name"]
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _plain(values):
+        # strings are stored as fixed width unicode, other objects can't be memory-mapped
+        if values.dtype.kind == "O" and all(isinstance(v, str) for v in values.flat):
+            return values.astype(str)
+        return values
+
+    def _save(self, frame):
+        names, columns, index_name = self._from_frame(frame)
+        arrays = {"index": names, **{f"col{i}": values for i, values in enumerate(columns.values())}}
+        arrays = {name: self._plain(values) for name, values in arrays.items()}
+        if any(values.dtype.kind not in "biufU" for values in arrays.values()):
+            return None  # object columns, keep in memory
+        parent = os.path.dirname(os.path.abspath(self.cache_dir))
+        tmp = None
+        try:
+            os.makedirs(parent, exist_ok=True)
+            tmp = tempfile.mkdtemp(dir=parent)
+            for name, values in arrays.items():
+                np.save(os.path.join(tmp, f"{name}.npy"), values)
+            meta = {"version": _version(), "columns": list(columns), "index_name": index_name}
+            with open(self._meta_path(tmp), "w") as f:
+                json.dump(meta, f)
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+            os.replace(tmp, self.cache_dir)
+        except OSError:
+            if tmp is not None:
+                shutil.rmtree(tmp, ignore_errors=True)
+            return None  # e.g. read-only location or another process writing
+        return self._load()
+
+@functools.lru_cache(maxsize=None)
+def get_store():
+    """The process-wide ScenarioStore."""
+    return ScenarioStore()
+
+def get_scenario():
+    """Shared scenario DataFrame (drop-in for laser_model's get_scenario, loaded once)."""
+    return get_store().frame
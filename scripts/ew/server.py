@@ -1,20 +1,42 @@
+import os
+import re
+import time
+import multiprocessing
+from collections import OrderedDict
 import umbridge
 import numpy as np
 from laser_model.england_wales.model import EnglandWalesModel
 from laser_model.england_wales.params import get_parameters
-from laser_model.england_wales.scenario import get_scenario
-from laser_model.mixing import init_gravity_diffusion
+from scenario_store import get_scenario
+from mixing_cache import MixingCache
+# optional compact responses, negotiated with config={'encoding': 'float32'}
+from viz_umbridge.encoding import FLOAT32_TAG, encode_float32
+import ensemble
 
 # from . import analyze as ana
 
-class ForwardModel(umbridge.Model):
-    def __init__(self, name: str ='forward', config: dict = None):
-        super().__init__(name)
+DEFAULT_SESSION = 'default'
+MAX_EXPIRED = 1024 # evicted session ids remembered to report them as expired
+CHECKPOINT_NAME = re.compile(r'^[A-Za-z0-9_.-]+$')
+
+class SessionExpired(RuntimeError):
+    pass
+
+class Session:
+    """
+    Simulation state of one client. Every session has its own model and tick;
+    the scenario and the mixing matrices are shared between sessions and
+    only read, never modified.
+    """
+
+    def __init__(self, mixing):
+        self.mixing = mixing
+        self.checkpoints = {} # named checkpoints of this session only
         self.reset()
-        self.config = config if config is not None else {}
         self.model = EnglandWalesModel(parameters=self.params, scenario=get_scenario())
         self.model.metrics = []
         self.reset()
+        self.last_used = time.monotonic()
 
     def reset(self):
         self.tick = 0
@@ -24,41 +46,226 @@ class ForwardModel(umbridge.Model):
         self.reset()
         self.model.init_state(get_scenario(), self.params)
 
-    def get_input_sizes(self, config):
-        return [0]
+    def update_params(self, config):
+        mix_flag = False
+        for p,v in config.items():
+            if p == 'mixing_scale':
+                v = np.power(10, v)
+            if (p in self.model.params) and (self.model.params[p]) != v:
+                self.model.params[p] = v
+                if p in ['distance_exponent', 'mixing_scale']:
+                    mix_flag = True
+        if mix_flag:
+            self.model.params['mixing'] = self.mixing(self.model.params.mixing_scale, self.model.params.distance_exponent)
+
+    def snapshot(self):
+        return self.tick, self.model.nodes.states.copy()
+
+    def restore(self, checkpoint):
+        tick, states = checkpoint
+        if states.shape != self.model.nodes.states.shape:
+            raise ValueError(f"Checkpoint has shape {states.shape}, model states have {self.model.nodes.states.shape}")
+        self.model.nodes.states[:] = states
+        self.tick = tick
 
-    def get_output_sizes(self, config):
-        return 2*[len(self.model.nodes)] + [1]
-    
     def step(self):
         self.model.step(self.tick)
         self.tick += 1
+
+    def observe(self):
+        prevalence = self.model.nodes.states[1] / self.model.nodes.states.sum(axis=0)
+        cases = self.model.nodes.states[1].copy() # number of cases is just infected because of 2 week time step
+        total_prevalence = self.model.nodes.states[1].sum() / self.model.nodes.states.sum()
+        return prevalence, cases, total_prevalence
+
+class ForwardModel(umbridge.Model):
+    """
+    England & Wales forward model serving many clients. Requests pick their
+    simulation with config['session_id'] (requests without one share the
+    'default' session). Sessions idle for more than idle_timeout seconds are
+    dropped, and at most max_sessions sessions exist at a time; a request for
+    a new session beyond that fails until one expires. A request for a dropped
+    session fails with SessionExpired instead of silently starting over at
+    tick 0, until the client sends config['reset'] = True.
+
+    Named checkpoints (tick and node states): config['restore'] = name loads
+    one before the ticks of a request, and config['snapshot'] = name saves the
+    state after them. Checkpoints belong to the session and are dropped with
+    it, so clients using the same name don't overwrite each other; with
+    config['shared_checkpoint'] = True the name refers to a checkpoint shared
+    by all sessions instead. With checkpoint_dir the shared checkpoints are
+    also written there as compressed .npz files, which survive a server
+    restart.
+    """
+
+    def __init__(self, name: str ='forward', config: dict = None, max_sessions=16, idle_timeout=600,
+                 checkpoint_dir=None):
+        super().__init__(name)
+        self.config = config if config is not None else {}
+        self.mixing = MixingCache()
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.sessions = {}
+        self.expired = OrderedDict() # evicted session ids (keys only)
+        self.checkpoints = {}
+        self.checkpoint_dir = checkpoint_dir
+        self.n_nodes = len(get_scenario()) # sessions (and their models) are created on first use
+
+    def get_session(self, session_id, reset=False):
+        now = time.monotonic()
+        for key in [k for k, v in self.sessions.items() if now - v.last_used > self.idle_timeout]:
+            del self.sessions[key]
+            if key != DEFAULT_SESSION:
+                self.expired[key] = None
+                if len(self.expired) > MAX_EXPIRED:
+                    self.expired.popitem(last=False)
+        session = self.sessions.get(session_id)
+        if session is None:
+            if session_id in self.expired:
+                if not reset:
+                    raise SessionExpired(f"Session {session_id!r} expired after {self.idle_timeout} s idle, send reset to start over")
+                del self.expired[session_id]
+            if len(self.sessions) >= self.max_sessions:
+                raise RuntimeError(f"Too many sessions ({self.max_sessions}), try again later")
+            session = self.sessions[session_id] = Session(self.mixing)
+        session.last_used = now
+        return session
+
+    def checkpoint_path(self, name):
+        """File of a checkpoint (None without checkpoint_dir); also validates the name."""
+        if not CHECKPOINT_NAME.match(name):
+            raise ValueError(f"Invalid checkpoint name {name!r}")
+        if self.checkpoint_dir is None:
+            return None
+        return os.path.join(self.checkpoint_dir, f"{name}.npz")
+
+    def save_checkpoint(self, name, checkpoint, session=None):
+        """Save a checkpoint of `session` only, or a shared one without a session."""
+        path = self.checkpoint_path(name)
+        if session is not None:
+            session.checkpoints[name] = checkpoint
+            return
+        self.checkpoints[name] = checkpoint
+        if path is not None:
+            os.makedirs(self.checkpoint_dir, exist_ok=True)
+            np.savez_compressed(path, tick=checkpoint[0], states=checkpoint[1])
+
+    def load_checkpoint(self, name, session=None):
+        """Checkpoint of `session`, or a shared one without a session."""
+        if session is not None:
+            self.checkpoint_path(name)
+            if name not in session.checkpoints:
+                raise KeyError(f"Unknown checkpoint {name!r}")
+            return session.checkpoints[name]
+        if name not in self.checkpoints:
+            path = self.checkpoint_path(name)
+            if path is None or not os.path.exists(path):
+                raise KeyError(f"Unknown checkpoint {name!r}")
+            with np.load(path) as data:
+                self.checkpoints[name] = (int(data['tick']), data['states'])
+        return self.checkpoints[name]
+
+    def get_input_sizes(self, config):
+        return [0]
+
+    @staticmethod
+    def get_records(config):
+        """
+        Ticks to run and which to return for a request: config['nsteps'] ticks (default 1),
+        recording every config['record_every'] ticks counted back from the last one (default
+        nsteps, i.e. only the final state).
+        """
+        nsteps = int(config.get('nsteps', 1))
+        every = int(config.get('record_every', nsteps))
+        if nsteps < 1 or every < 1:
+            raise ValueError(f"nsteps and record_every must be positive, got {nsteps} and {every}")
+        return nsteps, every, -(-nsteps // every)
+
+    def get_output_sizes(self, config):
+        # prevalence and cases are (records x nodes) blocks flattened row by row
+        records = self.get_records(config)[2]
+        sizes = 2*[records * self.n_nodes] + [records]
+        if config.get('encoding') == 'float32':
+            sizes += [1]
+        return sizes
     
     def __call__(self, parameters:list=None, config:dict=None):
-        if config is not None:
-            mix_flag = False
-            if config.get('reset', False):
-                self.reset_state()
-            for p,v in config.items():
-                if p == 'mixing_scale':
-                    v = np.power(10, v)
-                if (p in self.model.params) and (self.model.params[p]) != v:
-                    self.model.params[p] = v
-                    if p in ['distance_exponent', 'mixing_scale']:
-                        mix_flag = True
-            if mix_flag:
-                self.model.params['mixing'] = init_gravity_diffusion(get_scenario(), self.model.params.mixing_scale, self.model.params.distance_exponent)
-        self.step()
+        config = {} if config is None else config
+        session = self.get_session(config.get('session_id', DEFAULT_SESSION), config.get('reset', False))
+        if config.get('reset', False):
+            session.reset_state()
+        owner = None if config.get('shared_checkpoint', False) else session
+        if 'restore' in config:
+            session.restore(self.load_checkpoint(config['restore'], owner))
+        session.update_params(config)
+
+        # run the ticks, keeping every `every`-th state up to and including the last one
+        nsteps, every, _ = self.get_records(config)
+        records = []
+        for i in range(nsteps):
+            session.step()
+            if (nsteps - 1 - i) % every == 0:
+                records.append(session.observe())
+        if 'snapshot' in config:
+            self.save_checkpoint(config['snapshot'], session.snapshot(), owner)
 
         # package results
-        prevalence = self.model.nodes.states[1] / self.model.nodes.states.sum(axis=0)
-        cases = self.model.nodes.states[1] # number of cases is just infected because of 2 week time step
-        total_prevalence = self.model.nodes.states[1].sum() / self.model.nodes.states.sum()
-        return [prevalence.tolist(), cases.tolist(), [total_prevalence]]
+        prevalence = np.concatenate([r[0] for r in records])
+        cases = np.concatenate([r[1] for r in records])
+        total_prevalence = np.array([r[2] for r in records])
+        if config.get('encoding') == 'float32':
+            return [encode_float32(prevalence), encode_float32(cases), encode_float32(total_prevalence), [FLOAT32_TAG]]
+        return [prevalence.tolist(), cases.tolist(), total_prevalence.tolist()]
+
+    def supports_evaluate(self):
+        return True
+
+class EnsembleModel(umbridge.Model):
+    """
+    Batch of independent trajectories run in a process pool (see ensemble.py).
+    The input holds config['n_runs'] parameter sets of ensemble.PARAMETERS,
+    flattened run by run; each run simulates config['nticks'] ticks and drops
+    the first config['burnin']. The outputs are the (runs x ticks) total
+    prevalence, flattened, and the London phase slope and its standard error
+    per run.
+    """
+
+    def __init__(self, name: str = 'ensemble', max_workers=None):
+        super().__init__(name)
+        self.executor = ensemble.make_executor(max_workers)
+
+    @staticmethod
+    def get_shape(config):
+        return int(config.get('n_runs', 1)), int(config.get('nticks', 20 * ensemble.TICKS_PER_YEAR)), int(config.get('burnin', 0))
+
+    def get_input_sizes(self, config):
+        return [self.get_shape(config)[0] * len(ensemble.PARAMETERS)]
+
+    def get_output_sizes(self, config):
+        n_runs, nticks, burnin = self.get_shape(config)
+        return [n_runs * (nticks - burnin), n_runs, n_runs]
+
+    def __call__(self, parameters:list=None, config:dict=None):
+        n_runs, nticks, burnin = self.get_shape({} if config is None else config)
+        param_sets = np.reshape(parameters[0], (n_runs, len(ensemble.PARAMETERS)))
+        result = ensemble.run_ensemble(param_sets, nticks, burnin, executor=self.executor)
+        return [result['prevalence'].ravel().tolist(), result['slope'].tolist(), result['slope_se'].tolist()]
 
     def supports_evaluate(self):
         return True
 
-umbridge.serve_models(
-    [ForwardModel()], 4243
-)
\ No newline at end of file
+def serve_ensemble(port):
+    umbridge.serve_models([EnsembleModel()], port)
+
+if __name__ == "__main__":
+    # serve_models runs one request at a time, so the sweeps get their own server process and
+    # port rather than queueing the interactive sessions behind a long ensemble request
+    sweeps = multiprocessing.Process(target=serve_ensemble, args=(int(os.environ.get('EW_ENSEMBLE_PORT', 4244)),))
+    sweeps.start()
+    models = [ForwardModel(max_sessions=int(os.environ.get('EW_MAX_SESSIONS', 16)),
+                           idle_timeout=float(os.environ.get('EW_IDLE_TIMEOUT', 600)),
+                           checkpoint_dir=os.environ.get('EW_CHECKPOINT_DIR'))]
+    try:
+        umbridge.serve_models(models, 4243)
+    finally:
+        sweeps.terminate()
\ No newline at end of file
@@ -1,5 +1,6 @@
+import json
 import argparse
-import umbridge
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import panel as pn
 import sciris as sc
@@ -7,52 +8,27 @@ from bokeh import models
 from bokeh import plotting
 import viz_umbridge as vu
 
-PRIMARY_COLOR = "#780078"  # UM-Bridge purple
-SECONDARY_COLOR = "#F5A91E"  # UM-Bridge yellow
-
-class QFixedSizeBuffer(vu.FixedSizeFloatBuffer):
-    def __init__(self, n, hist_bins=25):
-        super().__init__(n)
-        self.hist = None
-        self.hist_bin_centers = None
-        if isinstance(hist_bins, (list, np.ndarray)):
-            self.num_hist_bins = len(hist_bins)
-            self.hist_bins = hist_bins
-        else:
-            self.num_hist_bins = hist_bins
-            self.hist_bins = None        
-        self.init_hist()
-
-    def init_hist(self):
-        if np.all(np.isnan(self.buffer)):
-            self.hist = [0, 0, 0]
-            self.hist_bins = [0, 1, 2, 4]
-        else:
-            self.hist, self.hist_bins = np.histogram(
-                self.buffer[np.isfinite(self.buffer)], bins=self.num_hist_bins
-            )
-        self.hist_bin_centers = [
-            0.5 * (self.hist_bins[i] + self.hist_bins[i + 1]) for i in range(len(self.hist_bins) - 1)
-        ]
-
-    def update_hist(self):
-        self.hist, _ = np.histogram(self.buffer, bins=self.hist_bins)
-
-class UmbridgePanelApp:
-    def __init__(self, url,  model_name="forward"):
-        self.url = url
-        self.model_name = model_name
-        self.callback_period = 50
-        self.prior_params = self.reset_params()
+class BeamApp(vu.UmbridgePanelApp):
+    def __init__(self, url,  model_name="forward", store=None):
+        # prior samples are independent, so stale ones can be dropped when rendering lags
+        super().__init__(url, 'MUQ Beam', model_name, pipeline=True, drop_policy="oldest")
+        self.batch_size = 1  # prior samples evaluated per request batch
+        self.max_batch_size = 32
+        self.request_pool = ThreadPoolExecutor(max_workers=self.max_batch_size)  # concurrent requests of a batch
+        self.store = store  # vu.EvaluationStore shared across sessions, or None
+        self.reset_params()
         self.connect_model()
         self.initialize_buffers()
+        self.prefill()
         self.initialize_data_sources()
         self.initialize_widgets()
         self.setup_plots()
         self.setup_template()
 
     def reset_params(self):
-        return sc.objdict({
+        super().reset_params()
+        self.callback_period = 50
+        self.prior_params = sc.objdict({
             "m1": 1.025,
             "m2": 1.025,
             "m3": 1.025,
@@ -61,75 +37,108 @@ class UmbridgePanelApp:
 
     def connect_model(self):
         print(f"Connecting to host URL {self.url}")
-        print(umbridge.supported_models(self.url))
-        self.model = umbridge.HTTPModel(self.url, self.model_name)
+        print(vu.supported_models(self.url))
+        self.model = vu.HTTPModel(self.url, self.model_name, pool_size=self.max_batch_size)
+        if self.store is not None:
+            self.model = vu.StoredModel(self.model, self.store, tag=self.prior_tag())
         self.num_beam_elements = self.model.get_output_sizes()[0]
         print(f"Number of beam elements: {self.num_beam_elements}")
 
     def initialize_buffers(self):
         buffer_size = 100
-        self.beam_values_buffer = vu.FixedSizeObjectBuffer(
-            buffer_size, placeholder=self.num_beam_elements * [0]
+        self.beam_values_buffer = vu.FixedSizeArrayBuffer(
+            buffer_size, self.num_beam_elements, placeholder=0
         )
-        self.Q1_buffer = QFixedSizeBuffer(buffer_size)
-        self.Q2_buffer = QFixedSizeBuffer(buffer_size)
+        self.Q1_buffer = vu.FixedSizeHistogramBuffer(buffer_size)
+        self.Q2_buffer = vu.FixedSizeHistogramBuffer(buffer_size)
+
+    def prior_tag(self):
+        # stored evaluations are grouped by the prior they were drawn from
+        return json.dumps(dict(self.prior_params), sort_keys=True)
+
+    def prefill(self):
+        """Fill the buffers with profiles stored by earlier sessions with the same prior."""
+        if self.store is None:
+            return
+        records = self.store.records(self.model_name, tag=self.prior_tag(), limit=self.beam_values_buffer.n)
+        if records:
+            self.n += self.consume([np.array([output[0] for _, output in records])])
+            print(f"Prefilled {len(records)} stored evaluations")
 
     def initialize_data_sources(self):
+        # the profiles are drawn as segments between neighbouring elements, so every
+        # column is one flat float array (num_beam_elements - 1 entries per profile)
+        elements = np.arange(self.num_beam_elements, dtype=float)
         self.beam_source = models.ColumnDataSource({
-            "beam_indices": [np.arange(self.num_beam_elements) for _ in range(self.beam_values_buffer.n)],
-            "beam_values": self.beam_values_buffer.buffer,
-            "Q1_element": self.Q1_buffer.n * [9],
-            "Q1_buffer": self.Q1_buffer.buffer,
-            "Q2_element": self.Q2_buffer.n * [24],
-            "Q2_buffer": self.Q2_buffer.buffer,
+            "x0": np.tile(elements[:-1], self.beam_values_buffer.n),
+            "x1": np.tile(elements[1:], self.beam_values_buffer.n),
         })
-        self.Q_source = models.ColumnDataSource({
-            "Q1_hist": self.Q1_buffer.hist,
-            "Q1_hist_bins": self.Q1_buffer.hist_bins,
-            "Q2_hist": self.Q2_buffer.hist,
-            "Q2_hist_bins": self.Q2_buffer.hist_bins,
+        self.Q_points_source = models.ColumnDataSource({
+            "Q1_element": np.full(self.Q1_buffer.n, 9.0),
+            "Q2_element": np.full(self.Q2_buffer.n, 24.0),
         })
-
-    def step(self):
-        param = list(
-            np.maximum(
-                0,
-                self.prior_params.width * np.random.randn(3) + np.array([
-                    self.prior_params.m1,
-                    self.prior_params.m2,
-                    self.prior_params.m3,
-                ]),
-            )
-        )
-        self.beam_values_buffer.add(self.model([param])[0])
-        self.Q1_buffer.add(self.beam_values_buffer.buffer[self.Q1_buffer.get_index()][9])
-        self.Q2_buffer.add(self.beam_values_buffer.buffer[self.Q2_buffer.get_index()][24])
-        self.Q1_buffer.init_hist()
-        self.Q2_buffer.init_hist()
-        self.update_sources()
-
-    def update_sources(self):
-        self.beam_source.data.update({
-            "beam_values": self.beam_values_buffer.buffer,
-            "Q1_buffer": self.Q1_buffer.buffer,
-            "Q2_buffer": self.Q2_buffer.buffer,
+        # only the slots overwritten since the last frame are sent to the browser
+        self.beam_updater = vu.BufferSource(self.beam_source, {
+            "y0": (self.beam_values_buffer, lambda rows: rows[:, :-1]),
+            "y1": (self.beam_values_buffer, lambda rows: rows[:, 1:]),
+        }, mode="patch")
+        self.Q_points_updater = vu.BufferSource(self.Q_points_source, {
+            "Q1_buffer": self.Q1_buffer,
+            "Q2_buffer": self.Q2_buffer,
+        }, mode="patch")
+        # one source per histogram, the number of occupied bins differs between them
+        self.Q1_source = models.ColumnDataSource({
+            "Q1_hist": vu.as_column(self.Q1_buffer.hist),
+            "Q1_hist_bins": vu.as_column(self.Q1_buffer.hist_bin_centers),
         })
-        self.Q_source.data.update({
-            "Q1_hist": self.Q1_buffer.hist,
-            "Q1_hist_bins": self.Q1_buffer.hist_bin_centers,
-            "Q2_hist": self.Q2_buffer.hist,
-            "Q2_hist_bins": self.Q2_buffer.hist_bin_centers,
+        self.Q2_source = models.ColumnDataSource({
+            "Q2_hist": vu.as_column(self.Q2_buffer.hist),
+            "Q2_hist_bins": vu.as_column(self.Q2_buffer.hist_bin_centers),
         })
 
-    def stream(self):
-        if not hasattr(self, 'n'):
-            self.n = 0
-        self.n += 1
-        self.step()
+    def forward(self, param):
+        return self.model([list(param)])[0]
+
+    def evaluate(self):
+        # runs in the producer thread: one batch of prior samples as concurrent requests
+        if self.store is not None:
+            self.model.tag = self.prior_tag()
+        params = np.maximum(
+            0,
+            self.prior_params.width * np.random.randn(self.batch_size, 3) + np.array([
+                self.prior_params.m1,
+                self.prior_params.m2,
+                self.prior_params.m3,
+            ]),
+        )
+        if self.store is None:
+            return np.array(list(self.request_pool.map(self.forward, params)))
+        # one store lookup and one write per batch, the misses as concurrent requests
+        outputs = self.model.evaluate_many([[list(p)] for p in params], map=self.request_pool.map)
+        return np.array([output[0] for output in outputs])
+
+    def consume(self, results):
+        profiles = np.concatenate(results)
+        self.beam_values_buffer.extend(profiles)
+        self.Q1_buffer.extend(profiles[:, 9])
+        self.Q2_buffer.extend(profiles[:, 24])
+        return len(profiles)
+
+    def update_plot_sources(self):
+        self.beam_updater.update()
+        self.Q_points_updater.update()
         self.beam_plot.title.text = f"N={self.n}"
+        self.Q1_source.data = {
+            "Q1_hist": vu.as_column(self.Q1_buffer.hist),
+            "Q1_hist_bins": vu.as_column(self.Q1_buffer.hist_bin_centers),
+        }
+        self.Q2_source.data = {
+            "Q2_hist": vu.as_column(self.Q2_buffer.hist),
+            "Q2_hist_bins": vu.as_column(self.Q2_buffer.hist_bin_centers),
+        }
 
     def initialize_widgets(self):
-        pn.extension(design="material", sizing_mode="stretch_width")
+        super().initialize_widgets()
         self.slider_m1 = pn.widgets.FloatSlider(
             value=self.prior_params.m1, start=0, end=2, step=0.05, name="M1"
         )
@@ -150,22 +159,10 @@ class UmbridgePanelApp:
         )
         self.slider_width.param.watch(self.on_width_change, 'value')
 
-        self.callback = pn.state.add_periodic_callback(
-            self.stream, self.callback_period, start=False
-        )
-
-        self.slider_speed = pn.widgets.FloatSlider(
-            value=self.callback_period, start=1, end=500, step=10, name="Refresh Rate (ms)"
+        self.slider_batch = pn.widgets.IntSlider(
+            value=self.batch_size, start=1, end=self.max_batch_size, name="Samples per Step"
         )
-        self.slider_speed.param.watch(self.on_speed_change, 'value')
-
-        self.reset_button = pn.widgets.Button(name="Reset")
-        self.reset_button.on_click(self.reset)
-
-        self.pause_button = pn.widgets.Toggle(
-            name="Start/Stop", value=False, button_type="primary"
-        )
-        self.pause_button.link(self.callback, bidirectional=True, value="running")
+        self.slider_batch.param.watch(self.on_batch_size_change, 'value')
 
     def on_m1_change(self, event):
         self.prior_params.m1 = event.new
@@ -179,17 +176,15 @@ class UmbridgePanelApp:
     def on_width_change(self, event):
         self.prior_params.width = event.new
 
-    def on_speed_change(self, event):
-        self.callback.period = event.new
+    def on_batch_size_change(self, event):
+        self.batch_size = event.new
 
     def reset(self, event):
-        self.prior_params = self.reset_params()
+        super().reset(event)
         self.slider_m1.value = self.prior_params.m1
         self.slider_m2.value = self.prior_params.m2
         self.slider_m3.value = self.prior_params.m3
         self.slider_width.value = self.prior_params.width
-        self.slider_speed.value = self.callback_period
-        self.n = 0
         if not self.callback.running:
             self.callback.start()
 
@@ -202,19 +197,21 @@ class UmbridgePanelApp:
             width=500,
             height=400,
         )
-        self.beam_plot.multi_line(
-            xs="beam_indices",
-            ys="beam_values",
+        self.beam_plot.segment(
+            x0="x0",
+            y0="y0",
+            x1="x1",
+            y1="y1",
             line_color='blue',
             line_width=0.5,
             alpha=0.2,
             source=self.beam_source,
         )
         self.beam_plot.scatter(
-            x="Q1_element", y="Q1_buffer", color='red', marker='x', source=self.beam_source
+            x="Q1_element", y="Q1_buffer", color='red', marker='x', source=self.Q_points_source
         )
         self.beam_plot.scatter(
-            x="Q2_element", y="Q2_buffer", color='red', marker='x', source=self.beam_source
+            x="Q2_element", y="Q2_buffer", color='red', marker='x', source=self.Q_points_source
         )
 
         self.Q1_plot = plotting.figure(
@@ -226,7 +223,7 @@ class UmbridgePanelApp:
             line_color='blue',
             mode="center",
             line_width=2,
-            source=self.Q_source,
+            source=self.Q1_source,
         )
 
         self.Q2_plot = plotting.figure(
@@ -238,7 +235,7 @@ class UmbridgePanelApp:
             line_color='blue',
             mode="center",
             line_width=2,
-            source=self.Q_source,
+            source=self.Q2_source,
         )
 
     def setup_template(self):
@@ -251,25 +248,26 @@ class UmbridgePanelApp:
             pn.layout.Divider(),
             "### Playback Controls",
             self.slider_speed,
+            self.slider_batch,
             pn.Row(self.reset_button, self.pause_button),
         )
 
         self.template = pn.template.MaterialTemplate(
             site="UM-Bridge App",
-            title="MUQ Beam",
-            header_background=PRIMARY_COLOR,
+            title=self.title,
+            header_background=vu.PRIMARY_COLOR,
             sidebar=[sliders],
             main=[pn.Row(self.beam_plot, self.Q1_plot, self.Q2_plot)],
         )
 
-    def serve(self):
-        pn.serve(self.template)
-
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Umbridge Panel App.')
     parser.add_argument('--url', type=str, default='http://localhost:4243',
                         help='The URL at which the model is running.')
+    parser.add_argument('--store', type=str, nargs='?', const=vu.DEFAULT_STORE, default=None,
+                        help='Store evaluations in this SQLite file (default location without a value) '
+                             'and reuse them across sessions.')
     args = parser.parse_args()
 
-    app = UmbridgePanelApp(url=args.url)
+    app = BeamApp(url=args.url, store=None if args.store is None else vu.EvaluationStore(args.store))
     app.serve()
@@ -6,7 +6,6 @@ https://um-bridge-benchmarks.readthedocs.io/en/docs/forward-benchmarks/muq-beam-
 """
 # https://github.com/InstituteforDiseaseModeling/laser-cohorts/blob/main/bokeh/england_wales_app.py
 import argparse
-import umbridge
 import numpy as np
 import panel as pn
 import sciris as sc
@@ -17,38 +16,6 @@ import viz_umbridge as vu
 PRIMARY_COLOR = "#780078" # UM-Bridge purple
 SECONDARY_COLOR = "#F5A91E" # UM-Bridge yellow
 
-# create a fixed size float buffer with additional histogram functionality
-class QFixedSizeBuffer(vu.FixedSizeFloatBuffer):
-    def __init__(self, n, hist_bins=25):
-        super().__init__(n)
-
-        # initialize the bins
-        self.hist = None
-        self.hist_bin_centers = None
-        if isinstance(hist_bins, (list, np.ndarray)):
-            self.num_hist_bins = len(hist_bins)
-            self.hist_bins = hist_bins
-        else:
-            self.num_hist_bins = hist_bins
-            self.hist_bins = None        
-        self.init_hist()
-
-    # intialize the histogram
-    def init_hist(self):
-        if np.all(np.isnan(self.buffer)):
-            # self.hist, self.hist_bins = np.histogram(np.zeros(self.n), bins=self.num_hist_bins)
-            self.hist = [0,0,0]
-            self.hist_bins = [0,1,2,4]
-        else:
-            self.hist, self.hist_bins = np.histogram(self.buffer[np.isfinite(self.buffer)], bins=self.num_hist_bins)
-        # remove the last bin edge for bokeh's step plot
-        self.hist_bin_centers = [0.5*(self.hist_bins[i] + self.hist_bins[i+1]) for i in range(len(self.hist_bins)-1)]
-
-    # update the histogram
-    def update_hist(self):
-        self.hist, _ = np.histogram(self.buffer, bins=self.hist_bins)
-
-
 # initialize umbridge connection
 # Read URL from command line argument
 parser = argparse.ArgumentParser(description='Minimal HTTP model demo.')
@@ -57,7 +24,7 @@ parser.add_argument('--url', metavar='url', type=str, default='http://localhost:
 args = parser.parse_args()
 print(f"Connecting to host URL {args.url}")
 # Print models supported by server
-print(umbridge.supported_models(args.url))
+print(vu.supported_models(args.url))
 
 # initialize parameters for the prior
 def reset_params():
@@ -71,30 +38,41 @@ def reset_params():
 prior_params = reset_params()
 
 # Set up a model by connecting to URL and selecting the "forward" model
-model = umbridge.HTTPModel(args.url, "forward")
+model = vu.HTTPModel(args.url, "forward")
 num_beam_elements = model.get_output_sizes()[0]
 print(f"Number of beam elements: {num_beam_elements}")
 
 
 # initialize results we are tracking / plotting
 buffer_size = 100
-beam_values_buffer = vu.FixedSizeObjectBuffer(buffer_size, placeholder=num_beam_elements*[0])
-Q1_buffer = QFixedSizeBuffer(buffer_size)
-Q2_buffer = QFixedSizeBuffer(buffer_size)
+beam_values_buffer = vu.FixedSizeArrayBuffer(buffer_size, num_beam_elements, placeholder=0)
+# float buffers that keep a histogram of their contents
+Q1_buffer = vu.FixedSizeHistogramBuffer(buffer_size)
+Q2_buffer = vu.FixedSizeHistogramBuffer(buffer_size)
 
+# profiles are drawn as segments between neighbouring elements (flat float columns)
+elements = np.arange(num_beam_elements, dtype=float)
 beam_source = models.ColumnDataSource({
-    "beam_indices": [np.arange(num_beam_elements) for _ in range(beam_values_buffer.n)],
-    "beam_values": beam_values_buffer.buffer,
-    "Q1_element": Q1_buffer.n*[9],
-    "Q1_buffer": Q1_buffer.buffer,
-    "Q2_element": Q2_buffer.n*[24],
-    "Q2_buffer": Q2_buffer.buffer,
+    "x0": np.tile(elements[:-1], beam_values_buffer.n),
+    "x1": np.tile(elements[1:], beam_values_buffer.n),
+})
+beam_updater = vu.BufferSource(beam_source, {
+    "y0": (beam_values_buffer, lambda rows: rows[:, :-1]),
+    "y1": (beam_values_buffer, lambda rows: rows[:, 1:]),
+}, mode="patch")
+Q_points_source = models.ColumnDataSource({
+    "Q1_element": np.full(Q1_buffer.n, 9.0),
+    "Q2_element": np.full(Q2_buffer.n, 24.0),
 })
-Q_source = models.ColumnDataSource({
-    "Q1_hist": Q1_buffer.hist,
-    "Q1_hist_bins": Q1_buffer.hist_bins,
-    "Q2_hist": Q2_buffer.hist,
-    "Q2_hist_bins": Q2_buffer.hist_bins,
+Q_points_updater = vu.BufferSource(Q_points_source, {"Q1_buffer": Q1_buffer, "Q2_buffer": Q2_buffer}, mode="patch")
+# one source per histogram, the number of occupied bins differs between them
+Q1_source = models.ColumnDataSource({
+    "Q1_hist": vu.as_column(Q1_buffer.hist),
+    "Q1_hist_bins": vu.as_column(Q1_buffer.hist_bin_centers),
+})
+Q2_source = models.ColumnDataSource({
+    "Q2_hist": vu.as_column(Q2_buffer.hist),
+    "Q2_hist_bins": vu.as_column(Q2_buffer.hist_bin_centers),
 })
 
 # create step function for evaluating the forward model
@@ -108,18 +86,11 @@ def step():
     Q1_buffer.add(beam_values_buffer.buffer[Q1_buffer.get_index()][9])
     Q2_buffer.add(beam_values_buffer.buffer[Q2_buffer.get_index()][24])
 
-    # update the histograms
-    Q1_buffer.init_hist()
-    Q2_buffer.init_hist()
-
     # update sources
-    beam_source.data["beam_values"] = beam_values_buffer.buffer
-    beam_source.data["Q1_buffer"] = Q1_buffer.buffer
-    beam_source.data["Q2_buffer"] = Q2_buffer.buffer
-    Q_source.data["Q1_hist"] = Q1_buffer.hist
-    Q_source.data["Q1_hist_bins"] = Q1_buffer.hist_bin_centers
-    Q_source.data["Q2_hist"] = Q2_buffer.hist
-    Q_source.data["Q2_hist_bins"] = Q2_buffer.hist_bin_centers
+    beam_updater.update()
+    Q_points_updater.update()
+    Q1_source.data = {"Q1_hist": vu.as_column(Q1_buffer.hist), "Q1_hist_bins": vu.as_column(Q1_buffer.hist_bin_centers)}
+    Q2_source.data = {"Q2_hist": vu.as_column(Q2_buffer.hist), "Q2_hist_bins": vu.as_column(Q2_buffer.hist_bin_centers)}
 
 
 # create streaming function for updating the plots
@@ -187,10 +158,10 @@ beam_plot = plotting.figure(
     width = 500,
     height = 400,
 )
-beam_plot.multi_line(xs="beam_indices", ys="beam_values", 
-                     line_color='blue', line_width=0.5, alpha=0.2, source=beam_source)
-beam_plot.scatter(x="Q1_element", y="Q1_buffer", color='red', marker='x', source=beam_source)
-beam_plot.scatter(x="Q2_element", y="Q2_buffer", color='red', marker='x', source=beam_source)
+beam_plot.segment(x0="x0", y0="y0", x1="x1", y1="y1",
+                  line_color='blue', line_width=0.5, alpha=0.2, source=beam_source)
+beam_plot.scatter(x="Q1_element", y="Q1_buffer", color='red', marker='x', source=Q_points_source)
+beam_plot.scatter(x="Q2_element", y="Q2_buffer", color='red', marker='x', source=Q_points_source)
 
 Q1_plot = plotting.figure(
     x_axis_label = "Q1",
@@ -199,7 +170,7 @@ Q1_plot = plotting.figure(
     height = 400,
     x_range = [0, 1200]
 )
-Q1_plot.step(x="Q1_hist_bins", y="Q1_hist", line_color='blue', mode="center", line_width=2, source=Q_source)
+Q1_plot.step(x="Q1_hist_bins", y="Q1_hist", line_color='blue', mode="center", line_width=2, source=Q1_source)
 
 Q2_plot = plotting.figure(
     x_axis_label = "Q2",
@@ -208,7 +179,7 @@ Q2_plot = plotting.figure(
     height = 400,
     x_range = [0, 1200]
 )
-Q2_plot.step(x="Q2_hist_bins", y="Q2_hist", line_color='blue', mode="center", line_width=2, source=Q_source)
+Q2_plot.step(x="Q2_hist_bins", y="Q2_hist", line_color='blue', mode="center", line_width=2, source=Q2_source)
 
 sliders = pn.Column(
     "### Prior parameters",
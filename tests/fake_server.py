@@ -0,0 +1,50 @@
+import json
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from viz_umbridge.client import get_transport
+
+class JSONHandler(BaseHTTPRequestHandler):
+    """
+    Base for fake UM-Bridge servers: keep-alive JSON replies, and every request
+    is recorded in server.connections (client addresses) and server.requests
+    (count per path).
+    """
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def log_message(self, *args):
+        pass
+
+    def parse_request(self):
+        ok = super().parse_request()
+        if ok:
+            self.server.connections.add(self.client_address)
+            self.server.requests[self.path] += 1
+        return ok
+
+    def read_json(self):
+        return json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+
+    def reply(self, body):
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+class FakeServer:
+    """TestCase mixin serving `handler` (a JSONHandler) at self.url during each test."""
+    handler = JSONHandler
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler)
+        self.server.connections = set()
+        self.server.requests = Counter()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def tearDown(self):
+        get_transport(self.url).close()
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,87 @@
+import os
+import time
+import tempfile
+import threading
+import unittest
+import importlib.util
+import numpy as np
+import viz_umbridge as vu
+from fake_server import FakeServer, JSONHandler
+
+BEAM_APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts", "muq_beam", "app.py")
+N_ELEMENTS = 31
+
+def load_beam_app():
+    spec = importlib.util.spec_from_file_location("beam_app", BEAM_APP)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.BeamApp
+
+class Handler(JSONHandler):
+    """Beam profiles (sum of the stiffnesses times the element), recording concurrent requests."""
+
+    def do_GET(self):
+        self.reply({"protocolVersion": 1.0, "models": ["forward"]})
+
+    def do_POST(self):
+        body = self.read_json()
+        if self.path == "/ModelInfo":
+            self.reply({"support": {"Evaluate": True}})
+        elif self.path == "/InputSizes":
+            self.reply({"inputSizes": [3]})
+        elif self.path == "/OutputSizes":
+            self.reply({"outputSizes": [N_ELEMENTS]})
+        elif self.path == "/Evaluate":
+            with self.server.lock:
+                self.server.active += 1
+                self.server.max_active = max(self.server.max_active, self.server.active)
+            time.sleep(0.05)
+            with self.server.lock:
+                self.server.active -= 1
+            self.reply({"output": [(sum(body["input"][0]) * np.arange(N_ELEMENTS)).tolist()]})
+
+class TestBeamApp(FakeServer, unittest.TestCase):
+    handler = Handler
+
+    @classmethod
+    def setUpClass(cls):
+        cls.BeamApp = load_beam_app()
+
+    def setUp(self):
+        super().setUp()
+        self.server.lock = threading.Lock()
+        self.server.active = self.server.max_active = 0
+
+    def test_batch(self):
+        app = self.BeamApp(self.url)
+        app.batch_size = 8
+        self.server.requests.clear()
+        batches = [app.evaluate(), app.evaluate()]
+        self.assertEqual(batches[0].shape, (8, N_ELEMENTS))
+        self.assertEqual(self.server.requests["/Evaluate"], 16)
+        self.assertGreater(self.server.max_active, 1)  # the draws of a batch are sent concurrently
+
+        # both batches go into the buffers in one update
+        self.assertEqual(app.consume(batches), 16)
+        profiles = np.concatenate(batches)
+        self.assertTrue(np.array_equal(app.beam_values_buffer.get_values()[-16:], profiles))
+        self.assertTrue(np.array_equal(app.Q1_buffer.get_values()[-16:], profiles[:, 9]))
+        self.assertTrue(np.array_equal(app.Q2_buffer.get_values()[-16:], profiles[:, 24]))
+
+    def test_stored_batch(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = vu.EvaluationStore(os.path.join(tmp, "evaluations.sqlite"))
+            app = self.BeamApp(self.url, store=store)
+            app.batch_size = 4
+            np.random.seed(0)
+            first = app.evaluate()
+            # the same draws again come from the store, without requests
+            self.server.requests.clear()
+            np.random.seed(0)
+            self.assertTrue(np.array_equal(app.evaluate(), first))
+            self.assertEqual(self.server.requests["/Evaluate"], 0)
+            self.assertEqual((app.model.hits, app.model.misses), (4, 4))
+            store.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+import numpy as np
+from viz_umbridge.caching import CachedModel
+
+class CountingModel:
+    name = "counting"
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, parameters, config={}):
+        self.calls += 1
+        return [[config.get("scale", 1) * sum(parameters[0])]]
+
+    def gradient(self, out_wrt, in_wrt, parameters, sens, config={}):
+        self.calls += 1
+        return [sens[0]] * len(parameters[0])
+
+    def get_input_sizes(self, config={}):
+        self.calls += 1
+        return [2]
+
+class TestCachedModel(unittest.TestCase):
+
+    def test_hits_and_keys(self):
+        inner = CountingModel()
+        model = CachedModel(inner)
+        self.assertEqual(model([[1.0, 2.0]], {"scale": 2, "a": 1}), [[6.0]])
+        # same bytes and equivalent config
+        self.assertEqual(model([np.array([1.0, 2.0]).tolist()], {"a": 1, "scale": 2}), [[6.0]])
+        self.assertEqual((model.hits, model.misses, inner.calls), (1, 1, 1))
+        # different config, input or operation
+        model([[1.0, 2.0]], {"scale": 3})
+        model([[1.0, 2.0 + 1e-15]], {"scale": 2, "a": 1})
+        self.assertEqual(model.gradient(0, 0, [[1.0, 2.0]], [0.5]), [0.5, 0.5])
+        self.assertEqual(model.gradient(0, 0, [[1.0, 2.0]], [0.5]), [0.5, 0.5])
+        self.assertEqual((model.hits, model.misses, inner.calls), (2, 4, 4))
+
+    def test_lru_and_copies(self):
+        inner = CountingModel()
+        model = CachedModel(inner, maxsize=2)
+        for x in (1.0, 2.0, 1.0, 3.0, 1.0, 2.0):
+            model([[x]])
+        self.assertEqual((model.hits, model.misses), (2, 4))
+        model([[1.0]])[0][0] = -1
+        self.assertEqual(model([[1.0]]), [[1.0]])
+        self.assertEqual(model.get_input_sizes(), [2])
+        self.assertEqual(model.get_input_sizes(), [2])
+        calls = inner.calls
+        model.clear()
+        model([[1.0]])
+        self.assertEqual(inner.calls, calls + 1)
+
+if __name__ == '__main__':
+    unittest.main()
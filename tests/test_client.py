@@ -0,0 +1,70 @@
+import unittest
+import numpy as np
+from viz_umbridge.client import HTTPModel, evaluate_batch
+from fake_server import FakeServer, JSONHandler
+
+class Handler(JSONHandler):
+
+    def do_GET(self):
+        self.reply({"protocolVersion": 1.0, "models": ["double"]})
+
+    def do_POST(self):
+        body = self.read_json()
+        if self.path == "/ModelInfo":
+            self.reply({"support": {"Evaluate": True, "Gradient": False}})
+        elif self.path == "/OutputSizes":
+            self.reply({"outputSizes": [2]})
+        elif self.path == "/Evaluate":
+            self.reply({"output": [[2 * x for x in body["input"][0]]]})
+
+class TestHTTPModel(FakeServer, unittest.TestCase):
+    handler = Handler
+
+    def test_connection_reuse(self):
+        model = HTTPModel(self.url, "double")
+        other = HTTPModel(self.url, "double")
+        self.assertIs(model.transport, other.transport)
+        for i in range(20):
+            self.assertEqual(model([[i, 1.0]]), [[2 * i, 2.0]])
+        self.assertEqual(other.get_output_sizes(), [2])
+        self.assertEqual(len(self.server.connections), 1)
+
+    def test_errors(self):
+        model = HTTPModel(self.url, "double")
+        with self.assertRaises(Exception):
+            model.gradient(0, 0, [[1.0]], [1.0])
+        with self.assertRaises(Exception):
+            model([1.0])
+        with self.assertRaises(Exception):
+            HTTPModel(self.url, "missing")
+
+class SumModel:
+    """x0 + x1 per point, stacked with config['batch'] if `batches`."""
+
+    def __init__(self, batches):
+        self.batches = batches
+        self.calls = 0
+
+    def get_input_sizes(self, config={}):
+        return [2 * config.get('batch', 1)] if self.batches else [2]
+
+    def get_output_sizes(self, config={}):
+        return [config.get('batch', 1)] if self.batches else [1]
+
+    def __call__(self, parameters, config={}):
+        self.calls += 1
+        return [np.reshape(parameters[0], (-1, 2)).sum(axis=1).tolist()]
+
+class TestEvaluateBatch(unittest.TestCase):
+
+    def test_batch_and_fallback(self):
+        points = np.random.default_rng(0).random((50, 2))
+        for batches, calls in ((True, 1), (False, 50)):
+            model = SumModel(batches)
+            values = evaluate_batch(model, points)
+            self.assertEqual(values.shape, (50, 1))
+            self.assertTrue(np.allclose(values[:, 0], points.sum(axis=1)))
+            self.assertEqual(model.calls, calls)
+
+if __name__ == '__main__':
+    unittest.main()
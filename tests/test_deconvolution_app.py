@@ -0,0 +1,70 @@
+import os
+import time
+import unittest
+import importlib.util
+from types import SimpleNamespace
+import numpy as np
+from pytensor import tensor as pt
+import viz_umbridge as vu
+
+DECONVOLUTION_APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts", "deconvolution_1d", "app.py")
+INPUT_DIM = 3
+
+def load_app_module():
+    spec = importlib.util.spec_from_file_location("deconvolution_app", DECONVOLUTION_APP)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def failing_logp(value):
+    raise RuntimeError("model failed")
+
+def gaussian_logp(value):
+    return -0.5 * pt.sum(value**2)
+
+class TestSamplingStep(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.module = load_app_module()
+
+    def make_app(self):
+        # the sampling state of the app without a server: buffers, plot source and a local log density
+        app = self.module.PanelPymcApp.__new__(self.module.PanelPymcApp)
+        vu.UmbridgePanelApp.__init__(app, "http://localhost:4245", asynchronous=True)
+        vu.UmbridgePanelApp.reset_params(app)
+        app.start = None
+        app.input_dim = INPUT_DIM
+        app.get_solution = lambda: [0.0] * INPUT_DIM
+        app.callback = SimpleNamespace(running=True)
+        app.sampler_callback = self.module.StopSamplingCallback(app)
+        app.initialize_buffers()
+        app.initialize_plot_sources()
+        return app
+
+    def stream_step(self, app):
+        app.stream()
+        app.pending.exception()  # let the step finish
+        time.sleep(app.frame_interval())
+        return app.stream()  # applies it, renders and starts the next one
+
+    def test_failed_step(self):
+        app = self.make_app()
+        app.op = failing_logp
+        for _ in range(2):
+            self.assertFalse(self.stream_step(app))
+        self.assertEqual(app.n, 0)
+        self.assertFalse(app.stale)
+        app.render(force=True)  # nothing sampled yet: the bands are left alone
+        self.assertEqual(app.plot_source.data["mean"].tolist(), [0.0] * INPUT_DIM)
+        app.wait_for_step()
+
+        # a working model draws again
+        app.op = gaussian_logp
+        self.assertTrue(self.stream_step(app))
+        app.wait_for_step()
+        self.assertEqual(app.n, 1)
+        self.assertTrue(np.all(np.isfinite(app.plot_source.data["mean"])))
+
+if __name__ == '__main__':
+    unittest.main()
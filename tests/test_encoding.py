@@ -0,0 +1,45 @@
+import json
+import unittest
+import numpy as np
+from viz_umbridge.encoding import FLOAT32_TAG, encode_float32, decode_outputs, supports_float32
+
+class FakeModel:
+
+    def __init__(self, encodes):
+        self.encodes = encodes
+
+    def get_output_sizes(self, config={}):
+        sizes = [4, 4, 1]
+        if self.encodes and config.get('encoding') == 'float32':
+            sizes += [1]
+        return sizes
+
+class TestFloat32Encoding(unittest.TestCase):
+
+    def test_round_trip(self):
+        values = np.random.default_rng(0).random(100) * 1e3
+        words = encode_float32(values)
+        self.assertTrue(all(isinstance(w, int) for w in words))
+        # survives the JSON response of the server
+        outputs = json.loads(json.dumps([words, encode_float32([0.5]), [FLOAT32_TAG]]))
+        decoded = decode_outputs(outputs, 'float32')
+        self.assertEqual(len(decoded), 2)
+        self.assertEqual(decoded[0].dtype, np.float32)
+        self.assertTrue(np.array_equal(decoded[0], values.astype(np.float32)))
+        self.assertEqual(decoded[1][0], 0.5)
+
+    def test_plain_outputs(self):
+        decoded = decode_outputs([[0.25, 1.5], [3.0]])
+        self.assertTrue(np.array_equal(decoded[0], [0.25, 1.5]))
+        self.assertTrue(np.array_equal(decoded[1], [3.0]))
+        # a plain last output that looks like the tag is data
+        decoded = decode_outputs([[0.25, 1.5], [32.0]])
+        self.assertEqual(len(decoded), 2)
+        self.assertTrue(np.array_equal(decoded[0], [0.25, 1.5]))
+
+    def test_negotiation(self):
+        self.assertTrue(supports_float32(FakeModel(True)))
+        self.assertFalse(supports_float32(FakeModel(False)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,283 @@
+import os
+import sys
+import time
+import tempfile
+import types
+import unittest
+import importlib.util
+import numpy as np
+import pandas as pd
+from fake_server import FakeServer, JSONHandler
+
+# The England & Wales scripts run against a small stand-in for laser_model
+# (not a dependency of viz_umbridge): a scenario of a few nodes and a model
+# whose infected count is tick + 1 in every node.
+EW_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts", "ew")
+EW_MODULES = ["ew_app", "server", "ensemble", "mixing_cache", "scenario_store"]
+STUB_MODULES = ["laser_model", "laser_model.mixing", "laser_model.england_wales",
+                "laser_model.england_wales.params", "laser_model.england_wales.scenario",
+                "laser_model.england_wales.model"]
+N_NODES = 5
+
+class Parameters(dict):
+    __getattr__ = dict.__getitem__
+
+class Nodes:
+    def __init__(self, n):
+        self.states = np.ones((3, n))
+
+    def __len__(self):
+        return self.states.shape[1]
+
+class StubModel:
+    created = 0
+
+    def __init__(self, parameters, scenario):
+        StubModel.created += 1
+        self.params = parameters
+        self.nodes = Nodes(len(scenario))
+
+    def init_state(self, scenario, params):
+        self.nodes.states[:] = 1
+
+    def step(self, tick):
+        self.nodes.states[1] = tick + 1
+
+def stub_scenario():
+    stub_scenario.calls += 1
+    return pd.DataFrame({"Long": np.linspace(-2, 0, N_NODES), "Lat": np.linspace(50, 53, N_NODES),
+                         "population": np.arange(N_NODES) + 100.0, "births": np.ones(N_NODES)},
+                        index=pd.Index(["London"] + [f"n{i}" for i in range(1, N_NODES)], name="placename"))
+stub_scenario.calls = 0
+
+def stub_mixing(df, scale, dist_exp):
+    # laser_model.mixing.init_gravity_diffusion, with its haversine distances
+    if len(df) == 1:
+        return np.ones((1, 1))
+    lat, lon = np.radians(df.Lat.values), np.radians(df.Long.values)
+    a = np.sin((lat[:, None] - lat[None, :]) / 2)**2 + \
+        np.cos(lat[:, None]) * np.cos(lat[None, :]) * np.sin((lon[:, None] - lon[None, :]) / 2)**2
+    distances = 2 * 6371.0 * np.arcsin(np.sqrt(a))
+    pops = np.array(df.population)
+    pops = pops[:, np.newaxis].T
+    pops = np.repeat(pops, pops.size, axis=0).astype(np.float64)
+    np.fill_diagonal(distances, 100000000)
+    diffusion_matrix = pops / (distances + 10) ** dist_exp
+    np.fill_diagonal(diffusion_matrix, 0)
+    diffusion_matrix = diffusion_matrix / np.mean(np.sum(diffusion_matrix, axis=1))
+    diffusion_matrix *= scale
+    diagonal = 1 - np.sum(diffusion_matrix, axis=1)
+    np.fill_diagonal(diffusion_matrix, diagonal)
+    return diffusion_matrix
+
+try:
+    from laser_model.mixing import init_gravity_diffusion # the real one where installed
+except ImportError:
+    init_gravity_diffusion = stub_mixing
+
+def setUpModule():
+    global tmp, scenario_store, mixing_cache, server, ew_app
+    tmp = tempfile.TemporaryDirectory()
+    modules = {name: types.ModuleType(name) for name in STUB_MODULES}
+    modules["laser_model.mixing"].init_gravity_diffusion = stub_mixing
+    modules["laser_model.england_wales.scenario"].get_scenario = stub_scenario
+    modules["laser_model.england_wales.params"].get_parameters = \
+        lambda overrides: Parameters(beta=1.0, seasonality=0.1, demog_scale=1.0, mixing_scale=1e-3, distance_exponent=1.5)
+    modules["laser_model.england_wales.model"].EnglandWalesModel = StubModel
+    sys.modules.update(modules)
+    sys.path.insert(0, EW_DIR)
+    os.environ["EW_SCENARIO_CACHE"] = os.path.join(tmp.name, "scenario")
+    import scenario_store, mixing_cache, server
+    spec = importlib.util.spec_from_file_location("ew_app", os.path.join(EW_DIR, "app.py"))
+    ew_app = sys.modules["ew_app"] = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(ew_app)
+
+def tearDownModule():
+    for name in STUB_MODULES + EW_MODULES:
+        sys.modules.pop(name, None)
+    sys.path.remove(EW_DIR)
+    del os.environ["EW_SCENARIO_CACHE"]
+    tmp.cleanup()
+
+class TestScenarioStore(unittest.TestCase):
+
+    def test_cache(self):
+        cache_dir = os.path.join(tmp.name, "store")
+        calls = stub_scenario.calls
+        store = scenario_store.ScenarioStore(cache_dir)
+        self.assertEqual(stub_scenario.calls, calls + 1)
+        pd.testing.assert_frame_equal(store.frame, stub_scenario())
+
+        # a later process maps the cache files instead of parsing
+        calls = stub_scenario.calls
+        other = scenario_store.ScenarioStore(cache_dir)
+        self.assertEqual(stub_scenario.calls, calls)
+        self.assertIsInstance(other.columns["Lat"], np.memmap)
+        self.assertFalse(other.frame["Lat"].values.flags.writeable)
+        self.assertEqual(list(other.frame.index), list(store.frame.index))
+        self.assertEqual(other.frame.index.name, "placename")
+
+class TestMixingCache(unittest.TestCase):
+
+    def test_matches_init_gravity_diffusion(self):
+        scenario = stub_scenario()
+        cache = mixing_cache.MixingCache(scenario)
+        for scale, exponent in ((1e-3, 1.5), (1e-2, 1.0), (1e-4, 2.0)):
+            self.assertTrue(np.allclose(cache(scale, exponent), init_gravity_diffusion(scenario, scale, exponent),
+                                        rtol=1e-12, atol=0))
+        single = mixing_cache.MixingCache(scenario.iloc[:1])
+        self.assertEqual(single(1e-3, 1.5).tolist(), [[1.0]])
+
+    def test_slider_grid(self):
+        cache = mixing_cache.MixingCache(stub_scenario())
+        grid = [(10.0**s, e) for s in np.arange(-4, -1.5, 0.5) for e in np.arange(1.0, 2.05, 0.1)]
+        for _ in range(2):
+            for scale, exponent in grid:
+                cache(scale, exponent)
+        self.assertEqual((cache.hits, cache.misses), (len(grid), len(grid)))  # nothing evicted
+
+    def test_lru(self):
+        cache = mixing_cache.MixingCache(stub_scenario(), maxsize=2)
+        first = cache(1e-3, 1.5)
+        self.assertIs(cache(1e-3, 1.5), first)
+        cache(1e-2, 1.5)
+        cache(1e-3, 1.5)
+        cache(1e-4, 1.5)  # drops 1e-2, the least recently used
+        self.assertEqual((cache.hits, cache.misses), (2, 3))
+        self.assertIs(cache(1e-3, 1.5), first)
+        cache(1e-2, 1.5)
+        self.assertEqual((cache.hits, cache.misses), (3, 4))
+
+class TestForwardModel(unittest.TestCase):
+
+    def setUp(self):
+        self.model = server.ForwardModel(checkpoint_dir=os.path.join(tmp.name, self.id()))
+
+    def call(self, **config):
+        prevalence, cases, total = self.model([[]], config)
+        return np.reshape(cases, (len(total), -1))[:, 0]
+
+    def test_records(self):
+        self.assertEqual(server.ForwardModel.get_records({}), (1, 1, 1))
+        self.assertEqual(server.ForwardModel.get_records({'nsteps': 10, 'record_every': 3}), (10, 3, 4))
+        with self.assertRaises(ValueError):
+            server.ForwardModel.get_records({'nsteps': 0})
+        config = {'nsteps': 10, 'record_every': 3}
+        self.assertEqual(self.model.get_output_sizes(config), [4 * N_NODES, 4 * N_NODES, 4])
+        # the last tick and every third one back from it
+        self.assertEqual(self.call(**config).tolist(), [1, 4, 7, 10])
+
+    def test_lazy_sessions(self):
+        created = StubModel.created
+        model = server.ForwardModel()
+        self.assertEqual(model.get_output_sizes({}), [N_NODES, N_NODES, 1])
+        self.assertEqual(StubModel.created, created)  # no model until the first request
+
+    def test_sessions(self):
+        self.assertEqual(self.call(session_id='a', nsteps=3).tolist(), [3])
+        self.assertEqual(self.call(session_id='b').tolist(), [1])
+        self.assertEqual(self.call(session_id='a').tolist(), [4])
+        self.assertEqual(self.call(session_id='a', reset=True).tolist(), [1])
+        self.assertEqual(self.call().tolist(), [1])  # the default session
+
+    def test_session_limit(self):
+        self.model.max_sessions = 2
+        self.call(session_id='a')
+        self.call(session_id='b')
+        with self.assertRaises(RuntimeError):
+            self.call(session_id='c')
+        self.call(session_id='a')
+
+    def test_expired_session(self):
+        self.call(session_id='a', nsteps=3)
+        self.call()
+        for session in self.model.sessions.values():
+            session.last_used -= 2 * self.model.idle_timeout
+        # an expired client session is an error rather than a fresh start at tick 0
+        with self.assertRaises(server.SessionExpired):
+            self.call(session_id='a')
+        with self.assertRaises(server.SessionExpired):
+            self.call(session_id='a')
+        self.assertEqual(self.call(session_id='a', reset=True).tolist(), [1])
+        self.assertEqual(self.call(session_id='a').tolist(), [2])
+        # the shared default session just starts over
+        self.assertEqual(self.call().tolist(), [1])
+
+    def test_checkpoints(self):
+        self.call(session_id='a', nsteps=5, snapshot='warm')
+        self.call(session_id='a', nsteps=5)
+        self.assertEqual(self.call(session_id='a', restore='warm').tolist(), [6])
+        with self.assertRaises(KeyError):
+            self.call(session_id='a', restore='cold')
+        with self.assertRaises(ValueError):
+            self.call(session_id='a', snapshot='../warm')
+
+        # the same name in another session is another checkpoint
+        self.call(session_id='b', nsteps=2, snapshot='warm')
+        self.assertEqual(self.call(session_id='a', restore='warm').tolist(), [6])
+        self.assertEqual(self.call(session_id='b', restore='warm').tolist(), [3])
+        with self.assertRaises(KeyError):
+            self.call(session_id='c', restore='warm')
+        self.assertEqual(self.model.checkpoints, {})
+
+    def test_shared_checkpoints(self):
+        self.call(session_id='a', nsteps=5, snapshot='warm', shared_checkpoint=True)
+        self.assertEqual(self.call(session_id='b', restore='warm', shared_checkpoint=True).tolist(), [6])
+        with self.assertRaises(KeyError):
+            self.call(session_id='b', restore='warm')
+
+        # kept on disk for a restarted server
+        restarted = server.ForwardModel(checkpoint_dir=self.model.checkpoint_dir)
+        tick, states = restarted.load_checkpoint('warm')
+        self.assertEqual(tick, 5)
+        self.assertTrue(np.array_equal(states, self.model.checkpoints['warm'][1]))
+
+class ForwardHandler(JSONHandler):
+    """Serves the server's ForwardModel (server.model) over the UM-Bridge protocol."""
+
+    def do_GET(self):
+        self.reply({"protocolVersion": 1.0, "models": ["forward"]})
+
+    def do_POST(self):
+        body = self.read_json()
+        model = self.server.model
+        config = body.get("config", {})
+        if self.path == "/ModelInfo":
+            self.reply({"support": {"Evaluate": True}})
+        elif self.path == "/InputSizes":
+            self.reply({"inputSizes": model.get_input_sizes(config)})
+        elif self.path == "/OutputSizes":
+            self.reply({"outputSizes": model.get_output_sizes(config)})
+        elif self.path == "/Evaluate":
+            self.reply({"output": model(body["input"], config)})
+
+class TestEWApp(FakeServer, unittest.TestCase):
+    handler = ForwardHandler
+
+    def setUp(self):
+        super().setUp()
+        self.server.model = server.ForwardModel()
+
+    def test_checkpoint_while_paused(self):
+        app = ew_app.EWApp(self.url)
+        self.assertFalse(app.pause_button.value)
+        app.stream_pipeline()  # starts the producer, which queues a few ticks
+        time.sleep(0.05)
+        app.stop_producer()
+        app.join_producer()
+        session = self.server.model.sessions[app.session_id]
+        tick = session.tick
+
+        # sent right away rather than on the next run, after the queued results
+        app.send_checkpoint('snapshot')
+        self.assertEqual(session.checkpoints['warm'][0], tick + 1)
+        self.assertEqual(app.n, tick + 1)
+        self.assertEqual(app.command, {})
+        self.assertTrue(app.queue.empty())
+
+        app.send_checkpoint('restore')
+        self.assertEqual(session.tick, tick + 2)  # restored, then one tick
+        self.assertEqual(app.n, tick + 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,6 +3,8 @@ import unittest
 import numpy as np
 from viz_umbridge.fixed_size_buffers import FixedSizeFloatBuffer
 from viz_umbridge.fixed_size_buffers import FixedSizeObjectBuffer
+from viz_umbridge.fixed_size_buffers import FixedSizeArrayBuffer
+from viz_umbridge.fixed_size_buffers import FixedSizeHistogramBuffer
 
 class TestFixedSizeFloatBuffer(unittest.TestCase):
 
@@ -28,6 +30,25 @@ class TestFixedSizeFloatBuffer(unittest.TestCase):
         buffer.add(5.0)
         self.assertTrue(np.array_equal(buffer.get_values(), [3.0, 4.0, 5.0]))
 
+    def test_extend(self):
+        buffer = FixedSizeFloatBuffer(3)
+        buffer.extend([1.0, 2.0])
+        self.assertTrue(np.array_equal(buffer.get_values(), [1.0, 2.0]))
+
+        buffer.extend([3.0, 4.0])
+        self.assertTrue(np.array_equal(buffer.get_values(), [2.0, 3.0, 4.0]))
+        self.assertTrue(np.array_equal(buffer.buffer, [4.0, 2.0, 3.0]))
+
+        buffer.extend([5.0, 6.0, 7.0, 8.0])
+        self.assertTrue(np.array_equal(buffer.get_values(), [6.0, 7.0, 8.0]))
+        self.assertEqual(buffer.get_index(), 2)
+
+    def test_get_values_is_view(self):
+        buffer = FixedSizeFloatBuffer(3)
+        buffer.extend([1.0, 2.0, 3.0, 4.0])
+        self.assertTrue(buffer.get_values().flags['C_CONTIGUOUS'])
+        self.assertTrue(np.shares_memory(buffer.get_values(), buffer.buffer))
+
     def test_repr(self):
         buffer = FixedSizeFloatBuffer(3)
         buffer.add(1.0)
@@ -91,5 +112,79 @@ class TestFixedSizeObjectBuffer(unittest.TestCase):
         buffer.add(4)
         self.assertEqual(repr(buffer), "[2, 3, 4]")
 
+class TestFixedSizeArrayBuffer(unittest.TestCase):
+
+    def test_initialization(self):
+        buffer = FixedSizeArrayBuffer(5, 3, placeholder=0)
+        self.assertEqual(buffer.n, 5)
+        self.assertEqual(buffer.buffer.shape, (5, 3))
+        self.assertTrue(np.all(buffer.buffer == 0))
+        self.assertEqual(buffer.get_values().shape, (0, 3))
+        self.assertFalse(buffer.is_full)
+
+    def test_add_and_get_values(self):
+        buffer = FixedSizeArrayBuffer(3, 2)
+        buffer.add([1, 1])
+        buffer.add([2, 2])
+        self.assertTrue(np.array_equal(buffer.get_values(), [[1, 1], [2, 2]]))
+
+        buffer.add([3, 3])
+        self.assertTrue(np.array_equal(buffer.get_values(), [[1, 1], [2, 2], [3, 3]]))
+
+        buffer.add([4, 4])
+        self.assertTrue(np.array_equal(buffer.get_values(), [[2, 2], [3, 3], [4, 4]]))
+        self.assertTrue(np.array_equal(buffer.buffer, [[4, 4], [2, 2], [3, 3]]))
+
+    def test_get_values_is_view(self):
+        buffer = FixedSizeArrayBuffer(3, 2)
+        for i in range(5):
+            buffer.add([i, i])
+        self.assertTrue(np.shares_memory(buffer.get_values(), buffer.buffer))
+
+    def test_extend(self):
+        for start in range(4):
+            for k in range(8):
+                buffer = FixedSizeArrayBuffer(4, 2)
+                expected = []
+                for i in range(start):
+                    buffer.add([i, -i])
+                    expected.append([i, -i])
+                rows = np.array([[10 + i, -10 - i] for i in range(k)]).reshape(k, 2)
+                buffer.extend(rows)
+                expected = (expected + rows.tolist())[-4:]
+                self.assertTrue(np.array_equal(buffer.get_values(), np.reshape(expected, (-1, 2))))
+                self.assertEqual(buffer.is_full, start + k >= 4)
+                self.assertEqual(buffer.get_index(), (start + k) % 4)
+                self.assertEqual(buffer.count, start + k)
+
+    def test_clear(self):
+        buffer = FixedSizeArrayBuffer(3, 2, placeholder=0)
+        buffer.extend(np.ones((5, 2)))
+        buffer.clear()
+        self.assertEqual(len(buffer.get_values()), 0)
+        self.assertEqual(buffer.count, 0)
+        self.assertFalse(buffer.is_full)
+        self.assertTrue(np.all(buffer.buffer == 0))
+
+class TestFixedSizeHistogramBuffer(unittest.TestCase):
+
+    def test_empty(self):
+        buffer = FixedSizeHistogramBuffer(5)
+        self.assertTrue(np.array_equal(buffer.hist, [0, 0, 0]))
+        self.assertEqual(len(buffer.hist_bin_centers), len(buffer.hist))
+
+    def test_counts_follow_window(self):
+        rng = np.random.default_rng(0)
+        buffer = FixedSizeHistogramBuffer(50, hist_bins=25)
+        for value in rng.normal(500, 50, 200):
+            buffer.add(value)
+            values = buffer.get_values()
+            self.assertEqual(buffer.hist.sum(), len(values))
+            self.assertEqual(len(buffer.hist_bins), len(buffer.hist) + 1)
+            self.assertLessEqual(len(buffer.hist), 25)
+            self.assertTrue(buffer.hist_bins[0] <= values.min() and values.max() < buffer.hist_bins[-1])
+        counts, _ = np.histogram(buffer.get_values(), bins=buffer.hist_bins)
+        self.assertTrue(np.array_equal(counts, buffer.hist))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
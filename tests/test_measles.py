@@ -0,0 +1,75 @@
+import unittest
+import numpy as np
+import pywt
+from viz_umbridge.measles import calc_Ws, calc_Ws_batch, calc_phase_diffs
+from viz_umbridge.measles import get_transform, get_widths, log_transform, pad_data
+from viz_umbridge.measles import band_widths, StreamingWaveletTransform
+
+def make_cases(nt=104, n_nodes=12, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(nt)[:, None]
+    lag = rng.uniform(0, 2 * np.pi, n_nodes)
+    return rng.poisson(50 * (1 + np.sin(2 * np.pi * t / 52 + lag))).astype(float)
+
+class TestCalcWsBatch(unittest.TestCase):
+
+    def test_matches_per_node(self):
+        cases = make_cases()
+        cwt, frequencies = calc_Ws_batch(cases)
+        self.assertEqual(cwt.shape[1:], cases.shape)
+        for i in range(cases.shape[1]):
+            node_cwt, node_frequencies = calc_Ws(cases[:, i])
+            self.assertTrue(np.allclose(cwt[:, :, i], node_cwt, atol=1e-10))
+            self.assertTrue(np.allclose(frequencies, node_frequencies))
+
+    def test_phase_diffs(self):
+        cases = make_cases()
+        fmin, fmax = 1 / (3 * 26), 1 / (1.5 * 26)
+        phases = calc_phase_diffs(cases, 0, fmin, fmax)
+        ref_cwt, _ = calc_Ws(cases[:, 0])
+        for i in range(cases.shape[1]):
+            cwt, frequencies = calc_Ws(cases[:, i])
+            ind = np.logical_and(frequencies < fmax, frequencies > fmin)
+            expected = np.angle(np.mean((np.conjugate(ref_cwt) * cwt)[ind, :]))
+            self.assertAlmostEqual(phases[i], expected, places=10)
+        self.assertAlmostEqual(phases[0], 0.0)
+
+class TestWaveletTransform(unittest.TestCase):
+
+    def test_matches_pywt(self):
+        for nt in [50, 104]:
+            log_cases = log_transform(make_cases(nt=nt, n_nodes=1)[:, 0])
+            padded = pad_data(log_cases)
+            expected, frequencies = pywt.cwt(padded, get_widths(), pywt.ContinuousWavelet('cmor2-1'), 1)
+            offset = (expected.shape[1] - nt) // 2
+            expected = expected[:, offset:offset + nt]
+            transform = get_transform(nt)
+            self.assertTrue(np.allclose(transform(log_cases), expected, atol=1e-10))
+            self.assertTrue(np.allclose(transform.frequencies, frequencies))
+
+    def test_cached(self):
+        self.assertIs(get_transform(104), get_transform(104))
+        self.assertIs(get_transform(104, get_widths()), get_transform(104))
+        self.assertIsNot(get_transform(104), get_transform(52))
+
+class TestStreamingWaveletTransform(unittest.TestCase):
+
+    def test_matches_batch(self):
+        nt, n_nodes = 52, 5
+        widths = band_widths(1 / (3 * 26), 1 / (1.5 * 26))
+        cases = make_cases(nt=200, n_nodes=n_nodes)
+        stream = StreamingWaveletTransform(nt, n_nodes, widths, resync_every=10**6)
+        window = np.zeros((nt, n_nodes))
+        start = 0
+        for k in [1, 3, 26, 1, 7, 60, 2, 26]:
+            new = cases[start:start + k]
+            start += k
+            stream.update(new if k > 1 else new[0])
+            window = np.concatenate((window, new))[-nt:]
+            expected, _ = calc_Ws_batch(window, widths)
+            self.assertTrue(np.allclose(stream.coefficients(), expected, atol=1e-9))
+        phases = calc_phase_diffs(window, 2, 1 / (3 * 26), 1 / (1.5 * 26))
+        self.assertTrue(np.allclose(stream.phase_diffs(2), phases))
+
+if __name__ == '__main__':
+    unittest.main()
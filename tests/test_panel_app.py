@@ -0,0 +1,233 @@
+import time
+import threading
+import unittest
+from types import SimpleNamespace
+import panel as pn
+from viz_umbridge.panel_app import UmbridgePanelApp
+
+class CountingApp(UmbridgePanelApp):
+
+    def __init__(self, **kwargs):
+        super().__init__("http://localhost:4242", pipeline=True, **kwargs)
+        self.reset_params()
+        self.count = 0
+        self.consumed = []
+        self.renders = 0
+
+    def evaluate(self):
+        time.sleep(0.001)
+        self.count += 1
+        return self.count
+
+    def consume(self, results):
+        self.consumed += results
+        return len(results)
+
+    def update_plot_sources(self):
+        self.renders += 1
+
+class SyncApp(UmbridgePanelApp):
+
+    def __init__(self, **kwargs):
+        super().__init__("http://localhost:4242", **kwargs)
+        self.reset_params()
+        self.renders = 0
+
+    def step(self):
+        return True
+
+    def update_plot_sources(self):
+        self.renders += 1
+
+class AsyncApp(UmbridgePanelApp):
+
+    def __init__(self, **kwargs):
+        super().__init__("http://localhost:4242", asynchronous=True, **kwargs)
+        self.reset_params()
+        self.release = threading.Event()
+        self.steps = 0
+        self.fail = False
+        # stand-ins for the widgets reset() touches
+        self.callback = SimpleNamespace(running=False, stop=lambda: None)
+        self.slider_speed = SimpleNamespace(value=None)
+
+    def step(self):
+        self.release.wait(5)
+        self.steps += 1
+        if self.fail:
+            raise RuntimeError("model failed")
+        return True
+
+class FakeDocument:
+
+    def __init__(self):
+        self.callbacks = []
+
+    def add_next_tick_callback(self, callback):
+        self.callbacks.append(callback)
+
+class TestAsynchronous(unittest.TestCase):
+
+    def test_overlapping_ticks_are_skipped(self):
+        app = AsyncApp()
+        self.assertIsNone(app.stream())
+        for _ in range(5):
+            self.assertIsNone(app.stream())  # step still running
+        app.release.set()
+        app.pending.result()
+        self.assertTrue(app.stream())  # applies the step and starts the next
+        app.pending.result()
+        self.assertEqual((app.steps, app.n), (2, 1))
+
+    def test_reset_waits_for_step(self):
+        app = AsyncApp()
+        app.stream()
+        threading.Timer(0.05, app.release.set).start()
+        app.reset(None)
+        self.assertEqual(app.steps, 1)
+        self.assertIsNone(app.pending)
+        self.assertEqual(app.n, 0)  # the result of the old run is dropped
+
+    def test_step_exception(self):
+        app = AsyncApp()
+        app.release.set()
+        app.fail = True
+        app.stream()
+        self.assertIsInstance(app.pending.exception(), RuntimeError)
+        self.assertIsNone(app.stream())  # printed, skipped, and the next step is started
+        app.fail = False
+        app.pending.exception()
+        self.assertTrue(app.stream())
+        self.assertEqual(app.n, 1)
+
+    def test_applied_on_next_loop_iteration(self):
+        app = AsyncApp()
+        app.release.set()
+        doc = FakeDocument()
+        pn.state.curdoc = doc
+        try:
+            app.stream()
+        finally:
+            pn.state.curdoc = None
+        app.pending.exception()
+        deadline = time.time() + 1
+        while not doc.callbacks and time.time() < deadline:
+            time.sleep(0.001)  # done callbacks run just after the result is set
+        self.assertEqual(len(doc.callbacks), 1)
+        doc.callbacks[0]()
+        self.assertEqual(app.n, 1)
+        self.assertIsNone(app.pending)
+        self.assertFalse(app.stale)  # rendered by the callback
+
+class TestRenderThrottling(unittest.TestCase):
+
+    def test_steps_are_coalesced(self):
+        app = SyncApp(max_fps=10)
+        for _ in range(50):
+            app.stream()
+        self.assertEqual(app.n, 50)
+        self.assertEqual(app.renders, 1)  # the first frame, the rest fall in its interval
+        self.assertTrue(app.stale)
+        self.assertTrue(app.render(force=True))
+        self.assertEqual(app.renders, 2)
+        self.assertFalse(app.render(force=True))  # nothing new to show
+
+    def test_waits_for_browser(self):
+        app = SyncApp(max_fps=1000)
+        app.step()
+        for _ in range(3):
+            app.stream()
+            time.sleep(0.002)
+        self.assertEqual(app.renders, 3)  # no page acknowledges, nothing to wait for
+        app.frame_ack.acked = 1  # the page has painted the first frame only
+        for _ in range(3):
+            time.sleep(0.002)
+            app.stream()
+        self.assertEqual(app.renders, 3)
+        app.frame_ack.acked = app.frame_ack.sent
+        for _ in range(3):
+            time.sleep(0.002)
+            app.stream()
+        self.assertEqual(app.renders, 5)  # again two frames ahead
+        app.last_render -= app.ACK_TIMEOUT  # a lost acknowledgement doesn't stop the app
+        app.stream()
+        self.assertEqual(app.renders, 6)
+
+    def test_frame_interval_backs_off(self):
+        app = SyncApp(max_fps=100)
+        self.assertAlmostEqual(app.frame_interval(), 0.01)
+        app.render_cost = 0.05
+        self.assertAlmostEqual(app.frame_interval(), 0.05 / app.RENDER_LOAD)
+
+class TestPipeline(unittest.TestCase):
+
+    def test_drop_oldest(self):
+        app = CountingApp(queue_size=3, drop_policy="oldest")
+        for i in range(5):
+            app.put(i)
+        self.assertEqual(app.dropped, 2)
+        self.assertEqual([app.queue.get_nowait() for _ in range(3)], [2, 3, 4])
+
+    def test_drop_newest(self):
+        app = CountingApp(queue_size=3, drop_policy="newest")
+        for i in range(5):
+            app.put(i)
+        self.assertEqual(app.dropped, 2)
+        self.assertEqual([app.queue.get_nowait() for _ in range(3)], [0, 1, 2])
+
+    def test_invalid_policy(self):
+        with self.assertRaises(ValueError):
+            CountingApp(drop_policy="random")
+
+    def test_stream_drains_and_renders_once(self):
+        app = CountingApp(queue_size=4, drop_policy="block")
+        for _ in range(20):
+            app.stream()
+            time.sleep(0.01)
+        app.stop_producer()
+        # blocking keeps every result, in order, and each tick renders at most once
+        self.assertEqual(app.consumed, list(range(1, len(app.consumed) + 1)))
+        self.assertEqual(app.n, len(app.consumed))
+        self.assertLessEqual(app.renders, 20)
+        self.assertLess(app.renders, len(app.consumed))
+        self.assertEqual(app.dropped, 0)
+
+    def test_stop_does_not_wait(self):
+        app = SlowApp()
+        app.start_producer()
+        time.sleep(0.05)
+        start = time.perf_counter()
+        app.stop_producer()
+        self.assertLess(time.perf_counter() - start, 0.1)
+        app.producer.join()
+        self.assertEqual(app.queue.qsize(), 1)  # a pause keeps the last result
+
+    def test_reset_discards_running_evaluation(self):
+        app = SlowApp()
+        app.start_producer()
+        time.sleep(0.05)
+        app.stop_producer()
+        app.clear_queue()
+        app.producer.join()
+        self.assertTrue(app.queue.empty())
+
+    def test_reset_waits_for_evaluation(self):
+        app = SlowApp()
+        app.callback = SimpleNamespace(running=False, stop=lambda: None)
+        app.slider_speed = SimpleNamespace(value=None)
+        app.start_producer()
+        time.sleep(0.05)
+        app.reset(None)
+        # the evaluation finished before reset() returned and its result is dropped
+        self.assertFalse(app.producer.is_alive())
+        self.assertEqual(app.count, 1)
+        self.assertTrue(app.queue.empty())
+
+class SlowApp(CountingApp):
+
+    def evaluate(self):
+        time.sleep(0.3)
+        return super().evaluate()
+
+if __name__ == '__main__':
+    unittest.main()
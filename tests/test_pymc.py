@@ -0,0 +1,57 @@
+import unittest
+from collections import Counter
+import numpy as np
+import pytensor
+from pytensor import tensor as pt
+from viz_umbridge.pymc import UmbridgeOp
+from fake_server import FakeServer, JSONHandler
+
+class Handler(JSONHandler):
+    """Gaussian log density -|x|^2/2, with the fused value_and_gradient output."""
+
+    def do_GET(self):
+        self.reply({"protocolVersion": 1.0, "models": ["posterior"]})
+
+    def do_POST(self):
+        body = self.read_json()
+        fused = body.get("config", {}).get("value_and_gradient")
+        if self.path == "/ModelInfo":
+            self.reply({"support": {"Evaluate": True, "Gradient": True}})
+        elif self.path == "/InputSizes":
+            self.reply({"inputSizes": [2]})
+        elif self.path == "/OutputSizes":
+            self.reply({"outputSizes": [1, 2] if fused else [1]})
+        elif self.path == "/Evaluate":
+            x = np.array(body["input"][0])
+            outputs = [[-0.5 * float(x @ x)]]
+            self.reply({"output": outputs + [(-x).tolist()] if fused else outputs})
+        elif self.path == "/Gradient":
+            x = np.array(body["input"][0])
+            self.reply({"output": (-body["sens"][0] * x).tolist()})
+
+class TestFusedOp(FakeServer, unittest.TestCase):
+    handler = Handler
+
+    def value_and_grad(self, op):
+        x = pt.dvector("x")
+        logp = op(x)[0]
+        return pytensor.function([x], [logp, pt.grad(logp, x)])
+
+    def test_fused_requests(self):
+        for fused in (False, True):
+            op = UmbridgeOp(self.url, "posterior", fused=fused)
+            self.assertEqual(op.fused, fused)
+            f = self.value_and_grad(op)
+            self.server.requests.clear()
+            for x in ([1.0, 2.0], [0.5, -1.0], [0.5, -1.0]):
+                value, grad = f(np.array(x))
+                self.assertAlmostEqual(float(value), -0.5 * (x[0]**2 + x[1]**2))
+                self.assertTrue(np.allclose(grad, -np.array(x)))
+            if fused:
+                # one request per new point, none for the repeated one
+                self.assertEqual(self.server.requests, Counter({"/Evaluate": 2}))
+            else:
+                self.assertEqual(self.server.requests, Counter({"/Evaluate": 3, "/Gradient": 3}))
+
+if __name__ == '__main__':
+    unittest.main()
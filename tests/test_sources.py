@@ -0,0 +1,76 @@
+import unittest
+import numpy as np
+from bokeh.models import ColumnDataSource
+from viz_umbridge.fixed_size_buffers import FixedSizeFloatBuffer
+from viz_umbridge.fixed_size_buffers import FixedSizeArrayBuffer
+from viz_umbridge.sources import BufferSource
+
+class TestBufferSource(unittest.TestCase):
+
+    def test_stream_rollover(self):
+        time = FixedSizeFloatBuffer(4)
+        value = FixedSizeFloatBuffer(4)
+        source = ColumnDataSource({"time": [], "value": []})
+        updater = BufferSource(source, {"time": time, "value": value})
+        for k in (3, 1, 6):
+            t = np.arange(time.count, time.count + k, dtype=float)
+            time.extend(t)
+            value.extend(2 * t)
+            self.assertEqual(updater.update(), k)
+            self.assertTrue(np.array_equal(source.data["time"], time.get_values()))
+            self.assertTrue(np.array_equal(source.data["value"], value.get_values()))
+        self.assertEqual(updater.update(), 0)
+
+    def test_stream_out_of_step(self):
+        a = FixedSizeFloatBuffer(4)
+        b = FixedSizeFloatBuffer(4)
+        updater = BufferSource(ColumnDataSource({}), {"a": a, "b": b})
+        a.add(1.0)
+        with self.assertRaises(ValueError):
+            updater.update()
+
+    def test_patch_matches_storage(self):
+        rows = FixedSizeArrayBuffer(5, 2, placeholder=0)
+        values = FixedSizeFloatBuffer(5)
+        source = ColumnDataSource({"static": list(range(5))})
+        updater = BufferSource(source, {"rows": rows, "values": values}, mode="patch")
+        rng = np.random.default_rng(0)
+        for k in (2, 4, 1, 7, 3):
+            batch = rng.random((k, 2))
+            rows.extend(batch)
+            values.extend(batch[:, 0])
+            updater.update()
+            self.assertTrue(np.array_equal(np.array(source.data["rows"]), rows.buffer))
+            self.assertTrue(np.array_equal(source.data["values"], values.buffer, equal_nan=True))
+        self.assertEqual(source.data["static"], list(range(5)))
+
+    def test_patch_flat_transform(self):
+        rows = FixedSizeArrayBuffer(4, 3, placeholder=0)
+        source = ColumnDataSource({})
+        updater = BufferSource(source, {
+            "y0": (rows, lambda r: r[:, :-1]),
+            "y1": (rows, lambda r: r[:, 1:]),
+        }, mode="patch", dtype=np.float32)
+        rng = np.random.default_rng(1)
+        for k in (1, 3, 2, 5):
+            rows.extend(rng.random((k, 3)))
+            updater.update()
+            self.assertEqual(source.data["y0"].dtype, np.float32)
+            self.assertTrue(np.allclose(source.data["y0"], rows.buffer[:, :-1].ravel()))
+            self.assertTrue(np.allclose(source.data["y1"], rows.buffer[:, 1:].ravel()))
+
+    def test_reset_after_clear(self):
+        time = FixedSizeFloatBuffer(3)
+        source = ColumnDataSource({"time": []})
+        updater = BufferSource(source, {"time": time})
+        time.extend([1.0, 2.0])
+        updater.update()
+        time.clear()
+        updater.reset()
+        self.assertEqual(len(source.data["time"]), 0)
+        time.add(5.0)
+        updater.update()
+        self.assertTrue(np.array_equal(source.data["time"], [5.0]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from viz_umbridge.store import EvaluationStore, StoredModel
+
+class SquareModel:
+    name = "square"
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, parameters, config={}):
+        self.calls += 1
+        return [[x * x for x in parameters[0]]]
+
+class TestEvaluationStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "evaluations.sqlite")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_persistence(self):
+        store = EvaluationStore(self.path)
+        inner = SquareModel()
+        model = StoredModel(inner, store, tag="a")
+        self.assertEqual(model([[1.0, 2.0]], {"k": 1}), [[1.0, 4.0]])
+        self.assertEqual(model([[1.0, 2.0]], {"k": 1}), [[1.0, 4.0]])
+        model([[1.0, 2.0]], {"k": 2})
+        model.tag = "b"
+        model([[3.0]])
+        self.assertEqual((model.hits, model.misses, inner.calls), (1, 3, 3))
+        store.close()
+
+        # another store (e.g. a later session) sees the entries
+        other = EvaluationStore(self.path)
+        self.assertEqual(len(other), 3)
+        self.assertEqual(other.get("square", [[1.0, 2.0]], {"k": 1}), [[1.0, 4.0]])
+        self.assertIsNone(other.get("square", [[1.0, 2.0]], {"k": 3}))
+        self.assertEqual(other.records("square", tag="b"), [([[3.0]], [[9.0]])])
+        self.assertEqual(len(other.records("square", tag="a", limit=1)), 1)
+
+    def test_size_cap(self):
+        store = EvaluationStore(self.path, max_bytes=2000)
+        for i in range(100):
+            store.put("square", [[float(i)] * 10], [[float(i)] * 10])
+        self.assertLessEqual(store.nbytes(), 2000)
+        self.assertIsNone(store.get("square", [[0.0] * 10]))
+        self.assertIsNotNone(store.get("square", [[99.0] * 10]))
+
+    def test_replace_and_recency(self):
+        store = EvaluationStore(self.path, max_bytes=2000)
+        for i in range(5):
+            store.put("square", [[float(i)] * 10], [[float(i)] * 10])
+        # rewriting an entry doesn't grow the store, so there is nothing to evict
+        with mock.patch.object(store, "evict", wraps=store.evict) as evict:
+            for _ in range(50):
+                store.put("square", [[4.0] * 10], [[4.0] * 10])
+        evict.assert_not_called()
+        self.assertEqual(len(store), 5)
+        # a lookup keeps an entry; its access time is written with the next put
+        self.assertIsNotNone(store.get("square", [[0.0] * 10]))
+        i = 5
+        while len(store) == i:  # until the first eviction
+            store.put("square", [[float(i)] * 10], [[float(i)] * 10])
+            i += 1
+        self.assertIsNotNone(store.get("square", [[0.0] * 10]))
+        self.assertIsNone(store.get("square", [[1.0] * 10]))
+
+    def test_batches(self):
+        store = EvaluationStore(self.path)
+        inner = SquareModel()
+        model = StoredModel(inner, store)
+        self.assertEqual(model.evaluate_many([[[1.0]], [[2.0]]]), [[[1.0]], [[4.0]]])
+        self.assertEqual(model.evaluate_many([[[2.0]], [[3.0]], [[1.0]]]), [[[4.0]], [[9.0]], [[1.0]]])
+        self.assertEqual((model.hits, model.misses, inner.calls), (2, 3, 3))
+        self.assertEqual(store.get_many("square", [[[3.0]], [[4.0]]]), [[[9.0]], None])
+
+    def test_threads(self):
+        store = EvaluationStore(self.path)
+        def work(k):
+            for i in range(20):
+                store.put("square", [[float(k), float(i)]], [[float(i)]])
+                store.get("square", [[float(k), float(i)]])
+        threads = [threading.Thread(target=work, args=(k,)) for k in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(store), 80)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+import numpy as np
+from viz_umbridge.fixed_size_buffers import FixedSizeArrayBuffer
+from viz_umbridge.fixed_size_buffers import FixedSizeFloatBuffer
+from viz_umbridge.streaming_stats import StreamingHistogram
+from viz_umbridge.streaming_stats import WindowedMoments
+
+class TestWindowedMoments(unittest.TestCase):
+
+    def test_add_remove(self):
+        rng = np.random.default_rng(0)
+        values = rng.normal(3, 2, (50, 4))
+        values[rng.random(values.shape) < 0.1] = np.nan
+        moments = WindowedMoments()
+        moments.add(values[:30])
+        moments.add(values[30:])
+        moments.remove(values[:20])
+        window = values[20:]
+        self.assertTrue(np.allclose(moments.mean, np.nanmean(window, axis=0)))
+        self.assertTrue(np.allclose(moments.variance(), np.nanvar(window, axis=0)))
+        self.assertTrue(np.allclose(moments.std(ddof=1), np.nanstd(window, axis=0, ddof=1)))
+
+    def test_empty(self):
+        moments = WindowedMoments()
+        moments.add([1.0, 2.0])
+        moments.remove([1.0, 2.0])
+        self.assertTrue(np.isnan(moments.mean))
+        self.assertTrue(np.isnan(moments.variance()))
+
+class TestStreamingHistogram(unittest.TestCase):
+
+    def test_quantiles(self):
+        rng = np.random.default_rng(1)
+        values = rng.exponential(1, (2000, 3)) * [1, 10, 1000]
+        histogram = StreamingHistogram()
+        histogram.add(values)
+        width = np.diff(histogram.edges(), axis=1)[:, 0]
+        for q in [0, 0.025, 0.5, 0.975, 1]:
+            expected = np.percentile(values, 100 * q, axis=0)
+            self.assertTrue(np.all(np.abs(histogram.quantile(q) - expected) <= width))
+
+    def test_remove(self):
+        rng = np.random.default_rng(2)
+        values = rng.normal(0, 1, 500) + np.linspace(0, 100, 500)
+        histogram = StreamingHistogram(bins=32)
+        for i in range(len(values)):
+            histogram.add(values[i:i + 1])
+            if i >= 50:
+                histogram.remove(values[i - 50:i - 49])
+        self.assertEqual(histogram.counts.sum(), 50)
+        self.assertTrue(np.all(histogram.counts >= 0))
+        edges = histogram.edges()[0]
+        self.assertTrue(edges[0] <= values[-50:].min() and values[-50:].max() < edges[-1])
+
+class TestBufferAccumulators(unittest.TestCase):
+
+    def test_array_buffer(self):
+        rng = np.random.default_rng(3)
+        moments = WindowedMoments()
+        histogram = StreamingHistogram()
+        buffer = FixedSizeArrayBuffer(20, 3, accumulators=[moments, histogram])
+        for k in [5, 1, 12, 30, 3, 1]:
+            buffer.extend(rng.normal(size=(k, 3)))
+            buffer.add(rng.normal(size=3))
+            window = buffer.get_values()
+            self.assertTrue(np.allclose(moments.mean, window.mean(axis=0)))
+            self.assertTrue(np.all(histogram.counts.sum(axis=1) == len(window)))
+
+    def test_refit_after_transient(self):
+        # wide burn-in values widen the bins; once evicted the bins must narrow again
+        rng = np.random.default_rng(4)
+        histogram = StreamingHistogram()
+        buffer = FixedSizeArrayBuffer(1000, 1, accumulators=[histogram])
+        buffer.extend(rng.uniform(-500, 500, (50, 1)))
+        for rows in np.split(rng.normal(0, 0.01, (5000, 1)), 50):
+            buffer.extend(rows)
+        window = buffer.get_values()
+        self.assertEqual(histogram.counts.sum(), len(window))
+        width = np.diff(histogram.edges(), axis=1)[0, 0]
+        self.assertLess(width, 0.01)
+        for q in [0.025, 0.5, 0.975]:
+            expected = np.percentile(window, 100 * q, axis=0)
+            self.assertTrue(np.all(np.abs(histogram.quantile(q) - expected) <= width))
+
+    def test_float_buffer(self):
+        moments = WindowedMoments()
+        buffer = FixedSizeFloatBuffer(3, accumulators=[moments])
+        for value in [1.0, 2.0, 3.0, 4.0]:
+            buffer.add(value)
+        self.assertAlmostEqual(moments.mean, 3.0)
+        buffer.extend([10.0, 20.0])
+        self.assertAlmostEqual(moments.mean, np.mean([4.0, 10.0, 20.0]))
+
+if __name__ == '__main__':
+    unittest.main()
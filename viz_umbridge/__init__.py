@@ -1,5 +1,11 @@
 from .fixed_size_buffers import * # noqa: F403
 from .panel_app import * # noqa: F403
+from .streaming_stats import * # noqa: F403
+from .sources import * # noqa: F403
+from .encoding import * # noqa: F403
+from .client import * # noqa: F403
+from .caching import * # noqa: F403
+from .store import * # noqa: F403
 from . import pymc
 from . import measles
 
@@ -0,0 +1,114 @@
+import json
+import threading
+from collections import OrderedDict
+import numpy as np
+import umbridge
+
+__all__ = ["CachedModel"]
+
+class CachedModel(umbridge.Model):
+    """
+    LRU memoization of an UM-Bridge model.
+
+    Samplers revisit points: Metropolis evaluates the current point again
+    after a rejection and each short `pm.sample(start=...)` call starts from
+    the last draw, find_MAP probes the same points repeatedly. Evaluations,
+    gradients, Jacobian and Hessian actions are cached by the exact bytes of
+    the float64 inputs (and vectors) plus the canonical JSON of the config,
+    so a revisited point never reaches the network. Input and output sizes
+    are cached per config. Thread-safe.
+
+    Args:
+        model (umbridge.Model): Model to wrap, e.g. a viz_umbridge.HTTPModel.
+        maxsize (int): Number of results kept.
+
+    Attributes:
+        hits (int): Number of requests answered from the cache.
+        misses (int): Number of requests passed to the model.
+    """
+
+    def __init__(self, model, maxsize=1024):
+        super().__init__(model.name)
+        self.model = model
+        self.maxsize = maxsize
+        self.results = OrderedDict()
+        self.sizes = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _config_key(config):
+        return json.dumps(config, sort_keys=True, default=repr)
+
+    @staticmethod
+    def _array_key(values):
+        values = [np.asarray(v, dtype=np.float64) for v in values]
+        return tuple((v.shape, v.tobytes()) for v in values)
+
+    def _cached(self, key, compute):
+        with self._lock:
+            if key in self.results:
+                self.hits += 1
+                self.results.move_to_end(key)
+                return _copy(self.results[key])
+            self.misses += 1
+        result = compute()
+        with self._lock:
+            self.results[key] = _copy(result)
+            while len(self.results) > self.maxsize:
+                self.results.popitem(last=False)
+        return result
+
+    def clear(self):
+        """Forget all results (e.g. after the server changed)."""
+        with self._lock:
+            self.results.clear()
+            self.sizes.clear()
+
+    def get_input_sizes(self, config={}):
+        key = ("input", self._config_key(config))
+        if key not in self.sizes:
+            self.sizes[key] = self.model.get_input_sizes(config)
+        return list(self.sizes[key])
+
+    def get_output_sizes(self, config={}):
+        key = ("output", self._config_key(config))
+        if key not in self.sizes:
+            self.sizes[key] = self.model.get_output_sizes(config)
+        return list(self.sizes[key])
+
+    def supports_evaluate(self):
+        return self.model.supports_evaluate()
+
+    def supports_gradient(self):
+        return self.model.supports_gradient()
+
+    def supports_apply_jacobian(self):
+        return self.model.supports_apply_jacobian()
+
+    def supports_apply_hessian(self):
+        return self.model.supports_apply_hessian()
+
+    def __call__(self, parameters, config={}):
+        key = ("evaluate", self._array_key(parameters), self._config_key(config))
+        return self._cached(key, lambda: self.model(parameters, config))
+
+    def gradient(self, out_wrt, in_wrt, parameters, sens, config={}):
+        key = ("gradient", out_wrt, in_wrt, self._array_key(parameters), self._array_key([sens]), self._config_key(config))
+        return self._cached(key, lambda: self.model.gradient(out_wrt, in_wrt, parameters, sens, config))
+
+    def apply_jacobian(self, out_wrt, in_wrt, parameters, vec, config={}):
+        key = ("jacobian", out_wrt, in_wrt, self._array_key(parameters), self._array_key([vec]), self._config_key(config))
+        return self._cached(key, lambda: self.model.apply_jacobian(out_wrt, in_wrt, parameters, vec, config))
+
+    def apply_hessian(self, out_wrt, in_wrt1, in_wrt2, parameters, sens, vec, config={}):
+        key = ("hessian", out_wrt, in_wrt1, in_wrt2, self._array_key(parameters),
+               self._array_key([sens, vec]), self._config_key(config))
+        return self._cached(key, lambda: self.model.apply_hessian(out_wrt, in_wrt1, in_wrt2, parameters, sens, vec, config))
+
+def _copy(result):
+    # results are (nested) lists, callers may modify what they get back
+    if isinstance(result, list):
+        return [_copy(v) for v in result]
+    return result
@@ -0,0 +1,176 @@
+import threading
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+import umbridge
+
+__all__ = ["Transport", "get_transport", "HTTPModel", "supported_models", "supports_batch", "evaluate_batch"]
+
+class Transport:
+    """
+    Keep-alive HTTP connection pool to one UM-Bridge server.
+
+    umbridge.HTTPModel goes through the module level `requests.post`, which
+    opens a new connection for every request (plus two extra requests each
+    time a model handle is created). A Transport keeps a `requests.Session`
+    with a pooled adapter instead, so consecutive requests reuse the open
+    connections and a tick costs about the compute time of the server.
+    Use get_transport() to share one Transport per URL.
+
+    Args:
+        url (str): Server URL.
+        pool_size (int): Connections kept open, at least the number of threads
+            making requests concurrently.
+        timeout (float or tuple): Request timeout in seconds, or a
+            (connect, read) tuple as in `requests`. None waits forever.
+        retries (int): Retries of failed connection attempts.
+    """
+
+    def __init__(self, url, pool_size=10, timeout=(10, None), retries=0):
+        self.url = url.rstrip("/")
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retries, pool_block=False)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._model_info = {}
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        response = self.session.get(f"{self.url}/{path}", timeout=self.timeout)
+        return self._check(response.json())
+
+    def post(self, path, payload):
+        response = self.session.post(f"{self.url}/{path}", json=payload, timeout=self.timeout)
+        return self._check(response.json())
+
+    @staticmethod
+    def _check(response):
+        if response is not None and "error" in response:
+            raise Exception(f'Model returned error of type {response["error"]["type"]}: {response["error"]["message"]}')
+        return response
+
+    def supported_models(self):
+        response = self.get("Info")
+        if response["protocolVersion"] != 1.0:
+            raise RuntimeWarning("Model has unsupported protocol version!")
+        return response["models"]
+
+    def model_info(self, name):
+        """Support flags of a model, requested once per Transport."""
+        with self._lock:
+            if name not in self._model_info:
+                models = self.supported_models()
+                if name not in models:
+                    raise Exception(f'Model {name} not supported by server! Supported models are: {models}')
+                self._model_info[name] = self.post("ModelInfo", {"name": name})["support"]
+            return self._model_info[name]
+
+    def close(self):
+        self.session.close()
+
+_transports = {}
+_transports_lock = threading.Lock()
+
+def get_transport(url, pool_size=10, timeout=(10, None), retries=0):
+    """Shared Transport for `url` (one per URL and settings in the process)."""
+    key = (url.rstrip("/"), pool_size, timeout, retries)
+    with _transports_lock:
+        if key not in _transports:
+            _transports[key] = Transport(*key)
+        return _transports[key]
+
+def supported_models(url, **kwargs):
+    """Drop-in for umbridge.supported_models over the shared Transport."""
+    return get_transport(url, **kwargs).supported_models()
+
+def supports_batch(model, n, config={}):
+    """
+    Ask an UM-Bridge model whether it evaluates n stacked points in one
+    request: such a model declares n times its input and output sizes when
+    the config has batch=n.
+    """
+    sizes = model.get_input_sizes(config), model.get_output_sizes(config)
+    batched = model.get_input_sizes({**config, 'batch': n}), model.get_output_sizes({**config, 'batch': n})
+    return all(b == [n * s for s in single] for single, b in zip(sizes, batched))
+
+def evaluate_batch(model, points, config={}):
+    """
+    First output of a model with one input at each row of `points`, e.g. the
+    log density on a grid. Models that support config['batch'] get a single
+    request, others one request per point.
+
+    Returns:
+        np.ndarray: (points x first output size) values.
+    """
+    points = np.atleast_2d(np.asarray(points, dtype=float))
+    n = len(points)
+    if n > 1 and supports_batch(model, n, config):
+        output = model([points.ravel().tolist()], {**config, 'batch': n})[0]
+        return np.reshape(output, (n, -1))
+    return np.array([model([list(p)], config)[0] for p in points])
+
+class HTTPModel(umbridge.Model):
+    """
+    Drop-in for umbridge.HTTPModel (JSON protocol, no shared memory) that
+    sends its requests through a shared Transport. Handles to the same URL
+    share the open connections.
+
+    Args:
+        url (str): Server URL.
+        name (str): Model name.
+        transport (Transport): Transport to use, get_transport(url, **kwargs) by default.
+        **kwargs: Passed to get_transport().
+    """
+
+    def __init__(self, url, name, transport=None, **kwargs):
+        super().__init__(name)
+        self.url = url
+        self.transport = get_transport(url, **kwargs) if transport is None else transport
+        self.support = self.transport.model_info(name)
+
+    def get_input_sizes(self, config={}):
+        return self.transport.post("InputSizes", {"name": self.name, "config": config})["inputSizes"]
+
+    def get_output_sizes(self, config={}):
+        return self.transport.post("OutputSizes", {"name": self.name, "config": config})["outputSizes"]
+
+    def supports_evaluate(self):
+        return self.support.get("Evaluate", False)
+
+    def supports_gradient(self):
+        return self.support.get("Gradient", False)
+
+    def supports_apply_jacobian(self):
+        return self.support.get("ApplyJacobian", False)
+
+    def supports_apply_hessian(self):
+        return self.support.get("ApplyHessian", False)
+
+    @staticmethod
+    def _check_input(parameters):
+        if not isinstance(parameters, list) or not all(isinstance(x, list) for x in parameters):
+            raise Exception("Parameters must be a list of lists!")
+
+    def _request(self, path, supported, parameters, config, **fields):
+        if not supported:
+            raise Exception(f'{path} not supported by model!')
+        self._check_input(parameters)
+        payload = {"name": self.name, **fields, "input": parameters, "config": config}
+        return self.transport.post(path, payload)["output"]
+
+    def __call__(self, parameters, config={}):
+        return self._request("Evaluate", self.supports_evaluate(), parameters, config)
+
+    def gradient(self, out_wrt, in_wrt, parameters, sens, config={}):
+        return self._request("Gradient", self.supports_gradient(), parameters, config,
+                             outWrt=out_wrt, inWrt=in_wrt, sens=sens)
+
+    def apply_jacobian(self, out_wrt, in_wrt, parameters, vec, config={}):
+        return self._request("ApplyJacobian", self.supports_apply_jacobian(), parameters, config,
+                             outWrt=out_wrt, inWrt=in_wrt, vec=vec)
+
+    def apply_hessian(self, out_wrt, in_wrt1, in_wrt2, parameters, sens, vec, config={}):
+        return self._request("ApplyHessian", self.supports_apply_hessian(), parameters, config,
+                             outWrt=out_wrt, inWrt1=in_wrt1, inWrt2=in_wrt2, sens=sens, vec=vec)
@@ -0,0 +1,40 @@
+import numpy as np
+
+__all__ = ["FLOAT32_TAG", "encode_float32", "decode_outputs", "supports_float32"]
+
+# Last output of a model that answered with float32 words (see decode_outputs)
+FLOAT32_TAG = 32
+
+def encode_float32(values):
+    """
+    Encode values as the bit patterns of little-endian float32s, as a list of
+    ints. UM-Bridge responses are JSON number lists, and formatting/parsing a
+    10 digit integer is much cheaper than a 17 digit float.
+    """
+    return np.ascontiguousarray(values, dtype='<f4').view('<u4').tolist()
+
+def supports_float32(model, config=None):
+    """
+    Ask an UM-Bridge model whether it can answer with float32 words: such a
+    model declares one extra (tag) output when the config has
+    encoding='float32'. Models that ignore the key declare the usual outputs.
+    """
+    config = dict(config or {})
+    plain = model.get_output_sizes(config)
+    encoded = model.get_output_sizes({**config, 'encoding': 'float32'})
+    return len(encoded) == len(plain) + 1 and encoded[-1] == 1
+
+def decode_outputs(outputs, encoding=None):
+    """
+    Decode a model response to float arrays. If float32 was requested
+    (encoding='float32'), a response that ends with the [FLOAT32_TAG] output
+    holds float32 words (see encode_float32). Anything else is taken to be
+    plain JSON floats: servers without the encoding still work, and a plain
+    response whose last output happens to be [32.0] is left alone.
+
+    Returns:
+        list: One np.ndarray per output (without the tag).
+    """
+    if encoding == 'float32' and len(outputs) and list(outputs[-1]) == [FLOAT32_TAG]:
+        return [np.array(words, dtype='<u4').view('<f4') for words in outputs[:-1]]
+    return [np.asarray(values, dtype=float) for values in outputs]
@@ -1,65 +1,208 @@
 import numpy as np
+from .streaming_stats import StreamingHistogram
 
-__all__ = ["FixedSizeObjectBuffer", "FixedSizeFloatBuffer"]
+__all__ = ["FixedSizeObjectBuffer", "FixedSizeFloatBuffer", "FixedSizeArrayBuffer", "FixedSizeHistogramBuffer"]
 
-class FixedSizeFloatBuffer:
+class FixedSizeArrayBuffer:
     """
-    A fixed-size buffer for storing float values. Once the buffer is full,
-    new values overwrite the oldest ones in a circular manner.
-    
+    A fixed-size buffer for storing rows of a NumPy array (e.g. one value per
+    node). Once the buffer is full, new rows overwrite the oldest ones in a
+    circular manner.
+
+    Rows are kept in one preallocated array of twice the capacity, with every
+    row written to both halves, so the rows in chronological order are always
+    a single contiguous slice.
+
+    Optional accumulators (e.g. WindowedMoments, StreamingHistogram) are kept
+    in sync with the window: they see every inserted row through add() and
+    every evicted row through remove(). Accumulators with a refit() method
+    are passed the whole window after every write.
+
     Attributes:
-        n (int): Maximum capacity of the buffer.
-        buffer (np.ndarray): Array to store the float values.
+        n (int): Maximum capacity of the buffer (number of rows).
+        buffer (np.ndarray): View of the n rows in storage order.
         placeholder (float): Placeholder value for empty slots.
-        next_index (int): Index where the next element will be inserted.
+        next_index (int): Index where the next row will be inserted.
         is_full (bool): Flag to check if the buffer has been filled at least once.
+        count (int): Total number of rows written since creation (or clear()).
+        accumulators (list): Statistics updated as rows enter and leave.
     """
-    
-    def __init__(self, n, placeholder=np.nan):
+
+    def __init__(self, n, shape, placeholder=np.nan, dtype=float, accumulators=None):
         self.n = n  # Maximum capacity of the buffer
-        self.buffer = np.full(n, np.nan)  # Initialize with NaNs
+        shape = (shape,) if np.isscalar(shape) else tuple(shape)
+        self._data = np.full((2 * n,) + shape, placeholder, dtype=dtype)  # Mirrored storage
+        self.buffer = self._data[:n]  # Rows in storage order
         self.placeholder = placeholder  # Placeholder value for empty slots
-        self.next_index = 0  # Index where the next element will be inserted
+        self._fill = placeholder  # Value the storage was initialised with
+        self.next_index = 0  # Index where the next row will be inserted
         self.is_full = False  # Flag to check if the buffer has been filled at least once
+        self.count = 0  # Total number of rows written
+        self.accumulators = [] if accumulators is None else list(accumulators)
 
-    def add(self, value):
+    def _update_accumulators(self, rows):
+        # rows are about to be written: evict the oldest rows they overwrite
+        size = self.n if self.is_full else self.next_index
+        n_evicted = min(size, max(0, size + len(rows) - self.n))
+        evicted = self.get_values()[:n_evicted]
+        for accumulator in self.accumulators:
+            if n_evicted:
+                accumulator.remove(evicted)
+            accumulator.add(rows)
+
+    def _refit_accumulators(self):
+        window = None
+        for accumulator in self.accumulators:
+            if hasattr(accumulator, "refit"):
+                window = self.get_values() if window is None else window
+                accumulator.refit(window)
+
+    def add(self, row):
         """
-        Add a new float to the buffer.
-        
+        Add a new row to the buffer.
+
         Args:
-            value (float): The float value to be added to the buffer.
+            row (array_like): Row with the buffer's row shape.
         """
-        self.buffer[self.next_index] = value
+        if self.accumulators:
+            self._update_accumulators(np.asarray(row)[np.newaxis])
+        self._data[self.next_index] = row
+        self._data[self.next_index + self.n] = row
         self.next_index = (self.next_index + 1) % self.n
+        self.count += 1
         if self.next_index == 0:
             self.is_full = True  # Buffer has wrapped around at least once
+        if self.accumulators:
+            self._refit_accumulators()
+
+    def extend(self, rows):
+        """
+        Add a batch of rows to the buffer (oldest first).
+
+        Args:
+            rows (array_like): Array of shape (k,) + row shape.
+        """
+        rows = np.asarray(rows)
+        if len(rows) == 0:
+            return
+        self.count += len(rows)
+        if self.accumulators:
+            self._update_accumulators(rows[-self.n:])
+        start = (self.next_index + max(len(rows) - self.n, 0)) % self.n
+        if len(rows) >= self.n:
+            rows = rows[-self.n:]  # Only the last n rows survive
+            self.is_full = True
+        k = len(rows)
+        end = start + k
+        self._data[start:end] = rows
+        if end <= self.n:
+            self._data[start + self.n:end + self.n] = rows
+        else:
+            self._data[start + self.n:] = rows[:self.n - start]
+            self._data[:end - self.n] = rows[self.n - start:]
+        self.next_index = end % self.n
+        if end >= self.n:
+            self.is_full = True  # Buffer has wrapped around at least once
+        if self.accumulators:
+            self._refit_accumulators()
+
+    def clear(self):
+        """Remove all rows (and their contributions to the accumulators)."""
+        values = self.get_values()
+        if len(values):
+            for accumulator in self.accumulators:
+                accumulator.remove(values)
+        self._data[:] = self._fill
+        self.next_index = 0
+        self.is_full = False
+        self.count = 0
 
     def get_values(self):
         """
         Retrieve buffer contents in the correct order (oldest to newest).
-        
+
         Returns:
-            np.ndarray: Array of float values in the buffer.
+            np.ndarray: View of the stored rows, no copy is made.
         """
         if not self.is_full:
             # Buffer hasn't wrapped around yet; return up to the current index
-            return self.buffer[:self.next_index]
+            return self._data[:self.next_index]
         else:
-            # Buffer is full; return elements starting from next_index to the end, then from start to next_index
-            return np.concatenate((self.buffer[self.next_index:], self.buffer[:self.next_index]))
-        
+            # Buffer is full; the mirror makes the n rows from next_index contiguous
+            return self._data[self.next_index:self.next_index + self.n]
+
     def get_index(self):
-        return self.next_index        
+        return self.next_index
 
     def __repr__(self):
-        """
-        Return a string representation of the buffer contents.
-        
-        Returns:
-            str: String representation of the buffer.
-        """
         return f"{self.get_values()}"
+
+
+class FixedSizeFloatBuffer(FixedSizeArrayBuffer):
+    """
+    A fixed-size buffer for storing float values. Once the buffer is full,
+    new values overwrite the oldest ones in a circular manner.
+
+    Values are mirrored into a backing array of twice the capacity, so the
+    ordered values are always one contiguous slice.
     
+    Attributes:
+        n (int): Maximum capacity of the buffer.
+        buffer (np.ndarray): Array to store the float values.
+        placeholder (float): Placeholder value for empty slots.
+        next_index (int): Index where the next element will be inserted.
+        is_full (bool): Flag to check if the buffer has been filled at least once.
+    """
+    
+    def __init__(self, n, placeholder=np.nan, accumulators=None):
+        super().__init__(n, (), placeholder=np.nan, accumulators=accumulators)  # Initialize with NaNs
+        self.placeholder = placeholder  # Placeholder value for empty slots
+
+
+class FixedSizeHistogramBuffer(FixedSizeFloatBuffer):
+    """
+    A fixed-size float buffer that keeps a histogram of its contents. Bin
+    counts are incremented as values enter the window and decremented as they
+    are evicted; the bins only change when the range of the values grows
+    (see StreamingHistogram).
+
+    Attributes:
+        histogram (StreamingHistogram): Histogram of the buffer contents.
+        hist (np.ndarray): Counts of the occupied bins.
+        hist_bins (np.ndarray): Edges of the occupied bins.
+        hist_bin_centers (np.ndarray): Centres of the occupied bins.
+    """
+
+    def __init__(self, n, hist_bins=25, placeholder=np.nan, accumulators=None):
+        self.histogram = StreamingHistogram(bins=hist_bins)
+        accumulators = [self.histogram] + ([] if accumulators is None else list(accumulators))
+        super().__init__(n, placeholder=placeholder, accumulators=accumulators)
+
+    def _occupied(self):
+        if self.histogram.counts is None or not self.histogram.counts.any():
+            return None
+        nonzero = np.nonzero(self.histogram.counts[0])[0]
+        return slice(nonzero[0], nonzero[-1] + 1)
+
+    @property
+    def hist(self):
+        occupied = self._occupied()
+        if occupied is None:
+            return np.zeros(3, dtype=np.int64)
+        return self.histogram.counts[0, occupied]
+
+    @property
+    def hist_bins(self):
+        occupied = self._occupied()
+        if occupied is None:
+            return np.array([0., 1., 2., 4.])
+        return self.histogram.edges()[0, occupied.start:occupied.stop + 1]
+
+    @property
+    def hist_bin_centers(self):
+        edges = self.hist_bins
+        return 0.5 * (edges[:-1] + edges[1:])
+
 
 class FixedSizeObjectBuffer:
     def __init__(self, n, placeholder=None):
@@ -89,4 +232,4 @@ class FixedSizeObjectBuffer:
         return self.next_index
 
     def __repr__(self):
-        return f"{self.get_values()}"
\ No newline at end of file
+        return f"{self.get_values()}"
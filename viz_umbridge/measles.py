@@ -1,6 +1,7 @@
 import pywt
 import os
 import sys
+import functools
 import sciris as sc
 import numpy as np
 import pandas as pd
@@ -12,48 +13,269 @@ import statsmodels.api as sm
 
 MAX_PERIOD = 7*26 # in bi-weeks
 
+WAVELET = 'cmor2-1'
+
 def pad_data(x):
     """
-    Pad data to the next power of 2
+    Pad data to the next power of 2 (along the first axis)
     """
     nx = len(x) # number of samples
     nx2 = (2**np.ceil(np.log(nx)/np.log(2))).astype(int) # next power of 2
-    x2 = np.zeros(nx2, dtype=x.dtype) # pad to next power of 2
+    x2 = np.zeros((nx2,) + x.shape[1:], dtype=x.dtype) # pad to next power of 2
     offset = (nx2-nx)//2 # offset
     x2[offset:(offset+nx)] = x # copy
     return x2
 
 def log_transform(x, debug=1):
     """
-    Log transform for case data
+    Log transform for case data (each column of a time x nodes matrix separately)
     """ 
     # add one and take log
     x = np.log(x+1)
     # set mean=0 and std=1
-    m = np.mean(x)
-    s = np.std(x)
+    m = np.mean(x, axis=0)
+    s = np.std(x, axis=0)
     x = (x - m)/s
     return x
 
+def get_widths(max_period=MAX_PERIOD):
+    """
+    Log-spaced wavelet widths from 1 to max_period
+    """
+    return np.logspace(np.log10(1), np.log10(max_period), int(max_period))
+
+def band_widths(fmin, fmax, widths=None, wavelet=WAVELET, dt=1):
+    """
+    Subset of the widths whose frequencies fall strictly inside (fmin, fmax)
+    """
+    widths = get_widths() if widths is None else np.asarray(widths)
+    # same precision as pywt.cwt uses for the returned frequencies
+    frequencies = pywt.scale2frequency(pywt.ContinuousWavelet(wavelet), widths, 10) / dt
+    return widths[np.logical_and(frequencies < fmax, frequencies > fmin)]
+
+class WaveletTransform:
+    """
+    Continuous wavelet transform for series of a fixed length, giving the same
+    coefficients as calc_Ws (pywt.cwt on the padded series, trimmed back to n).
+
+    The scaled kernels are built once. For a series of length n only kernel
+    offsets within +/-(n-1) matter, so each scale is stored as that truncated
+    impulse response and its FFT (the filter bank). A transform is then one
+    FFT of the data, a multiply by the filter bank and one inverse FFT.
+    Use get_transform to share instances.
+
+    Attributes:
+        n (int): Series length.
+        widths (np.ndarray): Wavelet widths (scales).
+        frequencies (np.ndarray): Frequency of each scale.
+        responses (np.ndarray): (scales x 2n-1) impulse responses, index n-1 is lag 0.
+        filters (np.ndarray): (scales x nfft) FFT of the impulse responses.
+    """
+
+    def __init__(self, n, widths=None, wavelet=WAVELET, dt=1):
+        self.n = n
+        self.widths = get_widths() if widths is None else np.asarray(widths, dtype=float)
+        self.wavelet = pywt.ContinuousWavelet(wavelet)
+        self.dt = dt
+
+        # same kernel construction as pywt.cwt
+        precision = 10
+        int_psi, x = pywt.integrate_wavelet(self.wavelet, precision=precision)
+        int_psi = np.conj(int_psi) if self.wavelet.complex_cwt else int_psi
+        step = x[1] - x[0]
+        lags = np.arange(-(n - 1), n)
+        self.responses = np.zeros((len(self.widths), len(lags)), dtype=complex)
+        for i, scale in enumerate(self.widths):
+            j = (np.arange(scale * (x[-1] - x[0]) + 1) / (scale * step)).astype(int)
+            kernel = int_psi[j[j < int_psi.size]][::-1]
+            # pywt.cwt returns -sqrt(scale) * diff(conv) centred on the input,
+            # so output t sees input t-lag through kernel[c+lag+1] - kernel[c+lag]
+            c = (kernel.size - 2) // 2
+            k = np.zeros(kernel.size + 4 * n, dtype=complex) # zero beyond the kernel support
+            k[2 * n:2 * n + kernel.size] = kernel
+            idx = 2 * n + c + lags
+            self.responses[i] = -np.sqrt(scale) * (k[idx + 1] - k[idx])
+
+        # linear (not circular) convolution of n samples with 2n-1 taps
+        self.nfft = int(2**np.ceil(np.log2(3 * n - 2)))
+        self.filters = np.fft.fft(self.responses, self.nfft, axis=1)
+        self.frequencies = pywt.scale2frequency(self.wavelet, self.widths, precision) / dt
+
+    def __call__(self, x, chunk_size=2**22):
+        """
+        Transform a (time,) series or a (time x nodes) matrix.
+
+        Args:
+            x (np.ndarray): Data with n samples along the first axis.
+            chunk_size (int): Approximate number of complex values per intermediate
+                array, scales are processed in chunks to bound memory.
+
+        Returns:
+            np.ndarray: (scales x time [x nodes]) coefficients.
+        """
+        x = np.asarray(x, dtype=float)
+        X = np.fft.fft(x, self.nfft, axis=0)
+        out = np.empty((len(self.widths),) + x.shape, dtype=complex)
+        filters = self.filters.reshape(self.filters.shape + (1,) * (x.ndim - 1))
+        step = max(1, chunk_size // X.size)
+        for i in range(0, len(self.widths), step):
+            conv = np.fft.ifft(filters[i:i + step] * X, axis=1)
+            out[i:i + step] = conv[:, self.n - 1:2 * self.n - 1]
+        if not self.wavelet.complex_cwt:
+            out = out.real
+        return out
+
+@functools.lru_cache(maxsize=32)
+def _cached_transform(n, widths, wavelet, dt):
+    return WaveletTransform(n, np.array(widths), wavelet, dt)
+
+def get_transform(n, widths=None, wavelet=WAVELET, dt=1):
+    """
+    Shared WaveletTransform keyed by (series length, widths, wavelet, dt)
+    """
+    widths = get_widths() if widths is None else widths
+    return _cached_transform(int(n), tuple(np.asarray(widths, dtype=float)), wavelet, dt)
+
 def calc_Ws(cases):
     # transform case data
-    log_cases = pad_data(log_transform(cases))
+    log_cases = log_transform(cases)
 
-    # setup and execute wavelet transform
+    # wavelet transform with the cached cmor2-1 filter bank
     # https://pywavelets.readthedocs.io/en/latest/ref/cwt.html#morlet-wavelet
-    wavelet = pywt.ContinuousWavelet('cmor2-1')
+    transform = get_transform(len(cases))
+    cwt = transform(log_cases)
+
+    return cwt, transform.frequencies.copy()
 
-    dt = 1 # 2 weeks
-    widths = np.logspace(np.log10(1), np.log10(MAX_PERIOD), int(MAX_PERIOD))
-    [cwt, frequencies] = pywt.cwt(log_cases, widths, wavelet, dt)
+def calc_Ws_batch(cases, widths=None, wavelet=WAVELET, dt=1):
+    """
+    Wavelet transform of every column of a (time x nodes) case matrix in one call.
+    Matches calling calc_Ws on each column.
+
+    Returns:
+        cwt (np.ndarray): (scales x time x nodes) coefficients
+        frequencies (np.ndarray): frequency of each scale
+    """
+    cases = np.asarray(cases)
+    transform = get_transform(cases.shape[0], widths, wavelet, dt)
+    cwt = transform(log_transform(cases))
+
+    return cwt, transform.frequencies.copy()
+
+def calc_phase_diffs(cases, ref, fmin, fmax, widths=None):
+    """
+    Phase of every node relative to node `ref`, i.e. the angle of the mean of
+    conj(W_ref) * W over time and the scales with frequency in (fmin, fmax).
+    Only the scales inside the band are transformed.
 
-    # Number of time steps in padded time series
-    nt = len(cases)
-    # trim matrix
-    offset = (cwt.shape[1] - nt) // 2
-    cwt = cwt[:, offset:offset + nt]
+    Args:
+        cases (np.ndarray): (time x nodes) case matrix
+        ref (int): column of the reference node
+    """
+    cwt, _ = calc_Ws_batch(cases, band_widths(fmin, fmax, widths))
+    return _phase_diffs(cwt, ref)
+
+def _phase_diffs(cwt, ref):
+    diff = np.conjugate(cwt[:, :, [ref]]) * cwt
+    return np.angle(np.mean(diff, axis=(0, 1)))
+
+class StreamingWaveletTransform:
+    """
+    Sliding-window calc_Ws_batch for a live (time x nodes) stream of cases.
+
+    The window starts filled with `fill` cases. Coefficients of log(cases+1)
+    are kept for the current window and updated as samples enter and leave:
+    shifting the window by k samples only changes the contributions of the k
+    evicted and k new samples, so an update costs O(k n) per scale and node
+    rather than a full transform. The mean/std normalisation of log_transform
+    is affine and is applied from running sums when the coefficients are read.
+    The window is re-transformed from scratch every `resync_every` samples to
+    stop round-off from accumulating.
+    """
 
-    return cwt, frequencies
+    def __init__(self, n, n_nodes, widths=None, wavelet=WAVELET, dt=1, fill=0, resync_every=None):
+        self.transform = get_transform(n, widths, wavelet, dt)
+        self.n = n
+        self.n_nodes = n_nodes
+        self.frequencies = self.transform.frequencies.copy()
+        self.resync_every = n if resync_every is None else resync_every
+        self.values = np.full((n, n_nodes), np.log(fill + 1), dtype=float) # log(cases+1), oldest first
+        # response of each output to a constant input, for the mean removal
+        lags = np.arange(n)[:, None] - np.arange(n)[None, :]
+        self.ones = self.transform.responses[:, n - 1 + lags].sum(axis=2)
+        self.resync()
+
+    def resync(self):
+        """Recompute the window coefficients and sums from the stored samples."""
+        self.raw = self.transform(self.values)
+        self.sum = self.values.sum(axis=0)
+        self.sum2 = (self.values**2).sum(axis=0)
+        self.since_resync = 0
+
+    def update(self, cases):
+        """
+        Push new samples into the window.
+
+        Args:
+            cases (np.ndarray): (nodes,) sample or (k x nodes) batch, oldest first.
+        """
+        y = np.log(np.asarray(cases, dtype=float).reshape(-1, self.n_nodes) + 1)
+        k = len(y)
+        n = self.n
+        if k >= n:
+            self.values[:] = y[-n:]
+            self.resync()
+            return
+        evicted = self.values[:k].copy()
+        self.values[:-k] = self.values[k:]
+        self.values[-k:] = y
+        self.sum += y.sum(axis=0) - evicted.sum(axis=0)
+        self.sum2 += (y**2).sum(axis=0) - (evicted**2).sum(axis=0)
+        self.since_resync += k
+        if self.since_resync >= self.resync_every:
+            self.resync()
+            return
+
+        responses = self.transform.responses
+        # kept outputs move k places earlier; remove the evicted samples and add the new ones
+        j = np.arange(n - k)[:, None]
+        lags = np.concatenate((j + k - np.arange(k), j - (n - k) - np.arange(k)), axis=1)
+        delta = responses[:, n - 1 + lags] @ np.concatenate((-evicted, y))
+        self.raw[:, :-k] = self.raw[:, k:]
+        self.raw[:, :-k] += delta
+        # the last k outputs are new, transform them directly
+        lags = np.arange(n - k, n)[:, None] - np.arange(n)[None, :]
+        self.raw[:, -k:] = responses[:, n - 1 + lags] @ self.values
+
+    def coefficients(self):
+        """
+        Returns:
+            np.ndarray: (scales x time x nodes) coefficients of the window, as calc_Ws_batch.
+        """
+        mean = self.sum / self.n
+        std = np.sqrt(np.maximum(self.sum2 / self.n - mean**2, 0))
+        return (self.raw - mean * self.ones[:, :, None]) / std
+
+    def phase_diffs(self, ref):
+        """Phase of every node relative to node `ref`, as calc_phase_diffs."""
+        return _phase_diffs(self.coefficients(), ref)
+
+def phase_slope(distances, phases):
+    """
+    Least squares line through the phase differences (in degrees) against
+    distance, ignoring non-finite phases.
+
+    Returns:
+        tuple: ([intercept, slope], [intercept se, slope se]); -inf/inf when
+        fewer than 3 points are finite.
+    """
+    distances = np.asarray(distances)
+    ind = np.isfinite(phases)
+    if ind.sum() <= 2:
+        return np.array([-np.inf, -np.inf]), np.array([np.inf, np.inf])
+    X = sm.add_constant(distances[ind][:, np.newaxis])
+    results = sm.OLS(180/np.pi*phases[ind], X).fit()
+    return results.params, results.bse
 
 def main(data, distances, sim_output, do_plot=False):
 
@@ -63,43 +285,18 @@ def main(data, distances, sim_output, do_plot=False):
     # identify which locations are within 30km of London
     ref_city = "London"
     j = data.placenames.index(ref_city)
-    ref_cwt, _ = calc_Ws(sim_output[:, 1, data.placenames.index(ref_city)].flatten())
-    x = []; y = [];
-    for i, city in enumerate(data.placenames):
-        distance = distances[i,j]
-        if i == j:
-            continue
-        cwt, frequencies = calc_Ws(sim_output[:, 1, i].flatten())
-        
-        diff = np.conjugate(ref_cwt)*cwt
-        ind = np.where(np.logical_and(frequencies < 1/(1.5 * 52), frequencies > 1 / (3 * 52)))
-        diff = diff[ind[0], :]
-
-        # # and by time
-        # ind = np.where(data.reports > 50)[0]
-        # diff = diff[:, ind]
-
-        x.append(distance)
-        y.append(np.angle(np.mean(diff)))
-
-    london_x = np.array(x); london_y = np.array(y)
-
-    def estimate_slope(x,y):
-        X = sm.add_constant(x[:, np.newaxis])
-        model = sm.OLS(y, X)
-        results = model.fit()
-        return results.params, results.bse
+    # phase of every city relative to London, all cities at once
+    phases = calc_phase_diffs(sim_output[:, 1, :], j, 1 / (3 * 52), 1/(1.5 * 52))
+    others = np.arange(len(data.placenames)) != j
+
+    london_x = np.asarray(distances)[others, j]; london_y = phases[others]
 
     result_dict = dict()
 
+    p, pe = phase_slope(london_x, london_y)
     ind = np.isfinite(london_y)
     london_x = london_x[ind]
     london_y = london_y[ind]
-    if ind.sum() > 2:
-        p,pe = estimate_slope(london_x, 180/np.pi*london_y)
-    else:
-        p = [-np.inf, -np.inf]
-        pe = [np.inf, np.inf]
     result_dict['London_m'] = (p[1],pe[1])
     result_dict['London_b'] = (p[0],pe[0])
 
@@ -1,15 +1,100 @@
+import queue
+import threading
+import time
+import traceback
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+import param
 import panel as pn
+from panel.reactive import ReactiveHTML
 
 PRIMARY_COLOR = "#780078"  # UM-Bridge purple
 SECONDARY_COLOR = "#F5A91E"  # UM-Bridge yellow
 
+class FrameAck(ReactiveHTML):
+    """
+    Invisible component that echoes the number of the last frame back from
+    the browser once it has been painted: the script runs when the patch
+    carrying `sent` is applied and answers two animation frames later.
+    Browsers don't run animation frames for hidden tabs, so those stop
+    acknowledging altogether.
+    """
+
+    sent = param.Integer(default=0)
+    acked = param.Integer(default=0)
+
+    _template = '<div id="ack" style="display: none"></div>'
+
+    _scripts = {
+        "sent": "requestAnimationFrame(() => requestAnimationFrame(() => { data.acked = data.sent }))",
+    }
+
 class UmbridgePanelApp:
-    def __init__(self, url, title: str = None, model_name="posterior"):
+    """
+    Base class for the UM-Bridge Panel apps.
+
+    By default step() runs synchronously inside the periodic callback. With
+    asynchronous=True, step() runs in a worker thread so the model call does
+    not block the Bokeh event loop: ticks that arrive while a step is still
+    running are skipped, a finished step is applied on the next iteration of
+    the event loop (or on the next tick without a served document), and
+    update_plot_sources() is only called from the event loop between two
+    steps. Exceptions raised by step() are printed and the step is skipped. In
+    this mode step() must only update buffers/state and leave the Bokeh
+    models to update_plot_sources().
+
+    With pipeline=True, model evaluation and rendering are decoupled: a producer
+    thread calls evaluate() as fast as the model allows and puts the results in
+    a bounded queue, and each periodic callback drains the queue, hands the
+    results to consume() and renders once with update_plot_sources(). When the
+    queue is full, drop_policy decides what happens: "oldest" discards the
+    oldest queued result, "newest" discards the new result and "block" makes
+    the producer wait (no results are lost, e.g. for stateful simulations).
+
+    Rendering is decoupled from the simulation tick in all modes: steps only
+    mark the plots as stale, and update_plot_sources() runs at most max_fps
+    times per second inside pn.io.hold(), so all source and title changes of
+    the steps since the last frame go out as one document update. The frame
+    interval also backs off when rendering (updating the sources and
+    dispatching the held events) takes more than RENDER_LOAD of the time.
+    Delivery and drawing in the browser are paced by a round-trip: every
+    frame bumps a counter that the page echoes back after painting it
+    (FrameAck), and no new frame is sent while MAX_PENDING_FRAMES are
+    unacknowledged, for at most ACK_TIMEOUT seconds. The app object (and so
+    the counter) is shared by all sessions, so the acknowledgement of any
+    open page releases the next frame.
+    """
+
+    DROP_POLICIES = ("oldest", "newest", "block")
+    RENDER_LOAD = 0.25  # largest fraction of the time spent rendering
+    MAX_PENDING_FRAMES = 2  # frames sent but not yet painted by the browser
+    ACK_TIMEOUT = 1.0  # send a frame anyway after this long without acknowledgement (s)
+    RESET_TIMEOUT = 10.0  # longest wait on a running evaluation in reset() (s)
+
+    def __init__(self, url, title: str = None, model_name="posterior", asynchronous=False,
+                 pipeline=False, queue_size=64, drop_policy="oldest", max_fps=30):
+        if drop_policy not in self.DROP_POLICIES:
+            raise ValueError(f"drop_policy must be one of {self.DROP_POLICIES}, got {drop_policy!r}")
         self.url = url
         self.model_name = model_name
         self.title = "Umbridge App" if title is None else title
         self.callback_period = None
         self.n = None
+        self.asynchronous = asynchronous
+        self.executor = None
+        self.pending = None
+        self.pipeline = pipeline
+        self.drop_policy = drop_policy
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0  # results discarded by the drop policy
+        self.producer = None
+        self.producer_stop = threading.Event()
+        self.generation = 0  # bumped by clear_queue(), older evaluations are discarded
+        self.max_fps = max_fps
+        self.stale = False  # steps have run since the last frame
+        self.last_render = None
+        self.render_cost = 0.0  # smoothed duration of a frame (s)
+        self.frame_ack = FrameAck(width=0, height=0, margin=0, sizing_mode="fixed")
 
         self.plots = []
         self.sliders = {}
@@ -43,6 +128,13 @@ class UmbridgePanelApp:
             name="Start/Stop", value=False, button_type="primary"
         )
         self.pause_button.link(self.callback, bidirectional=True, value="running")
+        self.pause_button.param.watch(self.on_pause_change, 'value')
+
+    def on_pause_change(self, event):
+        if not event.new:
+            self.stop_producer()
+            if self.pending is None:
+                self.render(force=True)  # show the last steps of a throttled run
 
     def on_speed_change(self, event):
         self.callback.period = event.new
@@ -50,14 +142,215 @@ class UmbridgePanelApp:
     def update_plot_sources(self):
         pass
 
+    def frame_interval(self):
+        """Minimum time between two frames (s)."""
+        return max(1 / self.max_fps, self.render_cost / self.RENDER_LOAD)
+
+    def frames_pending(self):
+        """Frames sent to the browser and not painted yet (0 before the first acknowledgement)."""
+        if self.frame_ack.acked == 0:
+            return 0  # no page is acknowledging (yet)
+        return self.frame_ack.sent - self.frame_ack.acked
+
+    def render(self, force=False):
+        """
+        Update the plots if steps have run since the last frame, the frame
+        interval has passed and the browser keeps up (or force is set).
+
+        Returns:
+            bool: Whether a frame was rendered.
+        """
+        if not self.stale:
+            return False
+        start = time.perf_counter()
+        if not force and self.last_render is not None:
+            elapsed = start - self.last_render
+            if elapsed < self.frame_interval():
+                return False
+            if self.frames_pending() >= self.MAX_PENDING_FRAMES and elapsed < self.ACK_TIMEOUT:
+                return False  # the browser is still behind
+        with pn.io.hold():
+            self.update_plot_sources()
+            self.frame_ack.sent += 1
+        end = time.perf_counter()
+        self.render_cost = 0.8 * self.render_cost + 0.2 * (end - start)
+        self.last_render = end
+        self.stale = False
+        return True
+
     def step(self):
         pass
 
+    def evaluate(self):
+        """Pipeline mode: produce one result (runs in the producer thread)."""
+        pass
+
+    def consume(self, results):
+        """
+        Pipeline mode: apply the results drained from the queue, oldest first.
+
+        Returns:
+            int: Number of steps the results represent (added to self.n).
+        """
+        return len(results)
+
     def stream(self):
+        if self.pipeline:
+            return self.stream_pipeline()
+        if self.asynchronous:
+            return self.stream_async()
         status = self.step()
         if status:
             self.n += 1
-        return status   
+            self.stale = True
+        self.render()
+        return status
+
+    def stream_async(self):
+        status = None
+        if self.pending is not None:
+            if not self.pending.done():
+                return None  # previous step still running, skip this tick
+            status = self.apply_step(self.pending)  # done, its callback hasn't run yet
+        # only render between steps, the worker writes the buffers
+        self.render()
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1)
+        future = self.pending = self.executor.submit(self.step)
+        doc = pn.state.curdoc
+        if doc is not None:
+            # add_next_tick_callback is the thread-safe way back onto the event loop
+            future.add_done_callback(lambda f: doc.add_next_tick_callback(partial(self.on_step_done, f)))
+        return status
+
+    def apply_step(self, future):
+        """
+        Asynchronous mode: apply a finished step, once (on the event loop).
+
+        Returns:
+            The status returned by step(), None if it raised or was already
+            applied or dropped by reset().
+        """
+        if future is not self.pending:
+            return None
+        self.pending = None
+        try:
+            status = future.result()
+        except Exception:
+            traceback.print_exc()
+            return None
+        if status:
+            self.n += 1
+            self.stale = True
+        return status
+
+    def on_step_done(self, future):
+        if self.apply_step(future):
+            self.render()
+
+    def stream_pipeline(self):
+        self.start_producer()
+        results = self.drain_queue()
+        status = self.consume(results) if results else None
+        if status:
+            self.n += status
+            self.stale = True
+        self.render()
+        return status
+
+    def drain_queue(self):
+        """Take the queued results, oldest first."""
+        results = []
+        for _ in range(self.queue.maxsize):  # bounded, a fast producer keeps refilling
+            try:
+                results.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return results
+
+    def produce(self):
+        while not self.producer_stop.is_set():
+            if self.drop_policy == "block" and self.queue.full():
+                # wait for room before evaluating, so a pause never discards a result
+                self.producer_stop.wait(0.01)
+                continue
+            generation = self.generation
+            try:
+                result = self.evaluate()
+            except Exception:
+                traceback.print_exc()
+                self.producer_stop.wait(1)  # don't spin on a persistent error
+                continue
+            if generation != self.generation:
+                continue  # the queue was cleared (reset) while evaluating
+            self.put(result)
+
+    def put(self, result):
+        if self.drop_policy == "block":
+            self.queue.put(result)  # single producer, room was checked in produce()
+        elif self.drop_policy == "newest":
+            try:
+                self.queue.put_nowait(result)
+            except queue.Full:
+                self.dropped += 1
+        else:
+            while True:
+                try:
+                    self.queue.put_nowait(result)
+                    return
+                except queue.Full:
+                    try:
+                        self.queue.get_nowait()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
+
+    def start_producer(self):
+        # a stopped producer that is still finishing its evaluation just carries on
+        self.producer_stop.clear()
+        if self.producer is None or not self.producer.is_alive():
+            self.producer = threading.Thread(target=self.produce, daemon=True)
+            self.producer.start()
+
+    def stop_producer(self):
+        """
+        Ask the producer thread to stop after its current evaluation, without
+        waiting for it (it may be in the middle of a long request). Its last
+        result is still queued unless clear_queue() is called in between.
+        """
+        self.producer_stop.set()
+
+    def join_producer(self, timeout=None):
+        """
+        Wait until the producer thread has finished its current evaluation
+        (after stop_producer()), at most `timeout` seconds.
+
+        Returns:
+            bool: Whether the producer has stopped.
+        """
+        if self.producer is not None:
+            self.producer.join(timeout)
+            if self.producer.is_alive():
+                return False
+        return True
+
+    def clear_queue(self):
+        """Drop the queued results and the result of a running evaluation."""
+        self.generation += 1
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+
+    def wait_for_step(self):
+        """Block until a running asynchronous step has finished and drop its result."""
+        if self.pending is not None:
+            future, self.pending = self.pending, None
+            try:
+                future.result()
+            except Exception:
+                traceback.print_exc()
 
     def setup_template(self, sliders: list =None):
         sliders = (
@@ -82,6 +375,13 @@ class UmbridgePanelApp:
 
 
     def reset(self,event):
+        self.wait_for_step()
+        self.stop_producer()
+        # a request still in flight must not reach the server after the reset request of a subclass
+        if not self.join_producer(self.RESET_TIMEOUT):
+            print(f"The running evaluation did not finish within {self.RESET_TIMEOUT} s")
+        self.clear_queue()
+        self.stale = False
         self.reset_params()
         self.slider_speed.value = self.callback_period
         self.n = 0        
@@ -89,4 +389,6 @@ class UmbridgePanelApp:
             self.callback.stop()
 
     def serve(self):
+        # every page needs the component to acknowledge frames
+        self.template.main.append(self.frame_ack)
         pn.serve(self.template)        
\ No newline at end of file
@@ -1,4 +1,12 @@
+import json
+import threading
+from collections import OrderedDict
+import numpy as np
 import pymc as pm
+from pytensor import tensor as pt
+from umbridge import pymc as _umbridge_pymc
+from .client import HTTPModel
+from .caching import CachedModel
 
 class Callback:
     def __init__(self, every=10):
@@ -13,3 +21,77 @@ class Callback:
             self.traces[draw.chain] = trace
             self.multitrace = pm.backends.base.MultiTrace(list(self.traces.values()))
 
+def supports_value_and_gradient(model, config=None):
+    """
+    Ask an UM-Bridge model with one scalar output whether it can return its
+    gradient with the value: such a model declares the gradient as a second
+    output when the config has value_and_gradient=True.
+    """
+    config = dict(config or {})
+    if model.get_output_sizes(config) != [1]:
+        return False
+    sizes = model.get_output_sizes({**config, 'value_and_gradient': True})
+    return sizes == [1, model.get_input_sizes(config)[0]]
+
+class UmbridgeFusedGradOp(pt.Op):
+    """Gradient of an UmbridgeOp taken from its fused value/gradient requests."""
+
+    itypes = [pt.dvector, pt.dvector]
+    otypes = [pt.dvector]
+
+    def __init__(self, op):
+        self.op = op
+
+    def perform(self, node, inputs_var, output_storage):
+        _, grad = self.op.value_and_gradient(inputs_var[0])
+        output_storage[0][0] = inputs_var[1][0] * grad
+
+class UmbridgeOp(_umbridge_pymc.UmbridgeOp):
+    """
+    umbridge.pymc.UmbridgeOp over a pooled viz_umbridge.HTTPModel (kwargs go
+    to get_transport). With `cache_size` the model is wrapped in a
+    CachedModel, so points the sampler revisits are not requested again.
+
+    With `fused=True` and a model that supports it (see
+    supports_value_and_gradient), the log density and its gradient come from
+    one request and the pair is kept for the last few inputs, so a NUTS
+    leapfrog step makes one round-trip instead of an Evaluate and a Gradient
+    request. Other models use the separate requests.
+    """
+
+    def __init__(self, url, name, config={}, cache_size=None, fused=False, **kwargs):
+        self.umbridge_model = HTTPModel(url, name, **kwargs)
+        if cache_size:
+            self.umbridge_model = CachedModel(self.umbridge_model, cache_size)
+        self.config = config
+        assert len(self.umbridge_model.get_input_sizes(config)) == 1
+        assert len(self.umbridge_model.get_output_sizes(config)) == 1
+        self.fused = fused and supports_value_and_gradient(self.umbridge_model, config)
+        if self.fused:
+            self.pairs = OrderedDict()
+            self.max_pairs = 8
+            self._lock = threading.Lock()
+            self.grad_op = UmbridgeFusedGradOp(self)
+        else:
+            self.grad_op = _umbridge_pymc.UmbridgeGradOp(self.umbridge_model, config)
+
+    def value_and_gradient(self, x):
+        """(value, gradient) arrays at x, from one fused request."""
+        x = np.asarray(x, dtype=np.float64)
+        key = (x.tobytes(), json.dumps(self.config, sort_keys=True, default=repr))
+        with self._lock:
+            if key in self.pairs:
+                self.pairs.move_to_end(key)
+                return self.pairs[key]
+        outputs = self.umbridge_model([x.tolist()], {**self.config, 'value_and_gradient': True})
+        pair = (np.asarray(outputs[0], dtype='float64'), np.asarray(outputs[1], dtype='float64'))
+        with self._lock:
+            self.pairs[key] = pair
+            while len(self.pairs) > self.max_pairs:
+                self.pairs.popitem(last=False)
+        return pair
+
+    def perform(self, node, inputs, output_storage):
+        if not self.fused:
+            return super().perform(node, inputs, output_storage)
+        output_storage[0][0] = self.value_and_gradient(inputs[0])[0].copy()
@@ -0,0 +1,139 @@
+import numpy as np
+
+__all__ = ["BufferSource", "as_column"]
+
+def as_column(values, dtype=np.float64):
+    """
+    Convert values (e.g. a list returned by a model) to a contiguous typed
+    array, which Bokeh sends to the browser as a binary buffer instead of JSON.
+    """
+    return np.ascontiguousarray(values, dtype=dtype)
+
+
+class BufferSource:
+    """
+    Keeps the columns of a Bokeh ColumnDataSource in sync with ring buffers
+    (FixedSizeArrayBuffer and subclasses) by sending only what changed since
+    the last update, instead of replacing the whole column.
+
+    Two layouts are supported:
+
+    - "stream": the columns hold the rows in chronological order. New rows
+      are appended with ColumnDataSource.stream(..., rollover=n), so the
+      browser drops the oldest rows itself. All buffers must be written in
+      lock step (e.g. time and value of a time series).
+    - "patch": the columns hold the rows in storage order (buffer.buffer).
+      The slots overwritten since the last update are sent with
+      ColumnDataSource.patch, as at most two slices per column.
+
+    Other columns of the source are left untouched. All columns are sent as
+    contiguous arrays of `dtype`, which Bokeh transfers as binary buffers.
+    Values of float buffers become 1D arrays and rows of array buffers lists
+    of 1D arrays (e.g. for multi_line). A column can instead be given as
+    (buffer, transform), where transform maps a (k x ...) block of rows to k*m
+    values for a fixed m: the column is then one flat array with m entries per
+    row, e.g. the NaN-free segment coordinates of many lines.
+
+    Attributes:
+        source (ColumnDataSource): The source that is updated.
+        buffers (dict): Column name -> buffer.
+        transforms (dict): Column name -> transform (or None).
+        mode (str): "stream" or "patch".
+        dtype (np.dtype): Data type of the columns (float64 or float32).
+        sent (dict): Column name -> buffer.count at the last update.
+    """
+
+    def __init__(self, source, buffers, mode="stream", dtype=np.float64):
+        if mode not in ("stream", "patch"):
+            raise ValueError(f"mode must be 'stream' or 'patch', got {mode!r}")
+        self.source = source
+        self.buffers = {}
+        self.transforms = {}
+        for name, buffer in buffers.items():
+            buffer, transform = buffer if isinstance(buffer, tuple) else (buffer, None)
+            self.buffers[name] = buffer
+            self.transforms[name] = transform
+        self.mode = mode
+        self.dtype = np.dtype(dtype)
+        self.sent = {}
+        self.reset()
+
+    def _column(self, name, rows):
+        # always copies, the buffer storage is overwritten in place
+        transform = self.transforms[name]
+        if transform is not None:
+            return np.array(transform(rows), dtype=self.dtype).ravel()
+        if rows.ndim > 1:
+            return [np.array(row, dtype=self.dtype) for row in rows]
+        return np.array(rows, dtype=self.dtype)
+
+    def _width(self, name):
+        # number of column entries per buffer row
+        if self.transforms[name] is None:
+            return 1
+        buffer = self.buffers[name]
+        return len(self._column(name, buffer.buffer[:1]))
+
+    def reset(self):
+        """Replace the columns with the current buffer contents (e.g. after clearing the buffers)."""
+        data = {}
+        for name, buffer in self.buffers.items():
+            rows = buffer.get_values() if self.mode == "stream" else buffer.buffer
+            data[name] = self._column(name, rows)
+            self.sent[name] = buffer.count
+        self.source.data.update(data)
+
+    def update(self):
+        """
+        Send the rows written since the last update.
+
+        Returns:
+            int: Number of new rows (the largest over the columns).
+        """
+        if self.mode == "stream":
+            return self._stream()
+        return self._patch()
+
+    def _stream(self):
+        counts = {name: buffer.count - self.sent[name] for name, buffer in self.buffers.items()}
+        new = set(counts.values())
+        if len(new) > 1:
+            raise ValueError(f"Streamed buffers are out of step: {counts}")
+        new = new.pop()
+        if new <= 0:
+            return 0
+        n = min(buffer.n for buffer in self.buffers.values())
+        data = {
+            name: self._column(name, buffer.get_values()[-min(new, buffer.n):])
+            for name, buffer in self.buffers.items()
+        }
+        rollover = min(n * self._width(name) for name in self.buffers)
+        self.source.stream(data, rollover=rollover)
+        for name, buffer in self.buffers.items():
+            self.sent[name] = buffer.count
+        return new
+
+    def _patch(self):
+        patches = {}
+        most = 0
+        for name, buffer in self.buffers.items():
+            new = buffer.count - self.sent[name]
+            self.sent[name] = buffer.count
+            if new <= 0:
+                continue
+            most = max(most, new)
+            end = buffer.next_index
+            start = (end - min(new, buffer.n)) % buffer.n
+            if new >= buffer.n:
+                spans = [(0, buffer.n)]
+            elif start < end:
+                spans = [(start, end)]
+            else:
+                spans = [(start, buffer.n), (0, end)]
+            m = self._width(name)
+            patches[name] = [
+                (slice(a * m, b * m), self._column(name, buffer.buffer[a:b])) for a, b in spans if b > a
+            ]
+        if patches:
+            self.source.patch(patches)
+        return most
@@ -0,0 +1,253 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+import umbridge
+
+__all__ = ["EvaluationStore", "StoredModel", "DEFAULT_STORE"]
+
+DEFAULT_STORE = os.environ.get(
+    "VIZ_UMBRIDGE_STORE", os.path.join(os.path.expanduser("~"), ".cache", "viz_umbridge", "evaluations.sqlite")
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS evaluations (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    config TEXT NOT NULL,
+    tag TEXT,
+    input TEXT NOT NULL,
+    output TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS evaluations_model ON evaluations (model, tag, accessed);
+CREATE INDEX IF NOT EXISTS evaluations_accessed ON evaluations (accessed);
+"""
+
+class EvaluationStore:
+    """
+    Persistent, content-addressed store of model evaluations in SQLite.
+
+    Each entry maps (model name, config, input) to the output. The key hashes
+    the model name, the config as sorted-key JSON and the exact float64 bytes
+    of the inputs, so only bit-identical requests match. The database runs in
+    WAL mode, so several apps (threads or processes) can read while one
+    writes. Each thread gets its own connection. Lookups only read; the
+    access times of hits are written in the same transaction as the next
+    entries, and get_many/put_many handle a whole batch at a time. When the
+    stored outputs exceed `max_bytes`, the least recently used entries are
+    dropped.
+
+    Args:
+        path (str): Database file, created if missing.
+        max_bytes (int): Cap on the size of the stored inputs and outputs.
+    """
+
+    def __init__(self, path=DEFAULT_STORE, max_bytes=256 * 2**20):
+        self.path = path
+        self.max_bytes = max_bytes
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._touched = {}  # key -> access time of hits not yet written
+        with self.connection() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+        self._bytes = self.nbytes()
+
+    def connection(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            self._local.db = db
+        return db
+
+    @staticmethod
+    def key(model, parameters, config={}):
+        h = hashlib.sha256()
+        h.update(model.encode())
+        h.update(b"\0" + json.dumps(config, sort_keys=True, default=repr).encode())
+        for values in parameters:
+            values = np.asarray(values, dtype=np.float64)
+            h.update(b"\0" + str(values.shape).encode() + values.tobytes())
+        return h.hexdigest()
+
+    def get(self, model, parameters, config={}):
+        """Stored output of the evaluation, or None."""
+        return self.get_many(model, [parameters], config)[0]
+
+    def get_many(self, model, parameter_sets, config={}):
+        """
+        Stored outputs of several evaluations (None where missing) in one query.
+        Lookups are read-only; the access times of the hits are written with
+        the next put or evict.
+        """
+        keys = [self.key(model, parameters, config) for parameters in parameter_sets]
+        found = {}
+        db = self.connection()
+        for i in range(0, len(keys), 500):  # below SQLite's limit on query parameters
+            chunk = keys[i:i + 500]
+            query = f"SELECT key, output FROM evaluations WHERE key IN ({', '.join('?' * len(chunk))})"
+            found.update(db.execute(query, chunk).fetchall())
+        if found:
+            now = time.time()
+            with self._lock:
+                self._touched.update((key, now) for key in found)
+        return [json.loads(found[key]) if key in found else None for key in keys]
+
+    def put(self, model, parameters, output, config={}, tag=None):
+        """Store the output of an evaluation; `tag` groups entries for records()."""
+        self.put_many(model, [parameters], [output], config, tag)
+
+    def put_many(self, model, parameter_sets, outputs, config={}, tag=None):
+        """Store the outputs of several evaluations in one transaction."""
+        config_json = json.dumps(config, sort_keys=True, default=repr)
+        now = time.time()
+        rows = []
+        for parameters, output in zip(parameter_sets, outputs):
+            inputs = json.dumps([np.asarray(values, dtype=np.float64).tolist() for values in parameters])
+            outputs_json = json.dumps(output)
+            size = len(inputs) + len(outputs_json)
+            rows.append((self.key(model, parameters, config), model, config_json, tag, inputs, outputs_json, size, now))
+        with self.connection() as db:
+            self._flush_touched(db)
+            db.executemany("INSERT OR REPLACE INTO evaluations VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        # an upper bound: replaced entries and the writes of other processes are only
+        # accounted for when the size is read back from the database
+        self._bytes += sum(row[6] for row in rows)
+        if self._bytes > self.max_bytes:
+            self._bytes = self.nbytes()
+            if self._bytes > self.max_bytes:
+                self.evict()
+
+    def _flush_touched(self, db):
+        with self._lock:
+            touched, self._touched = self._touched, {}
+        db.executemany("UPDATE evaluations SET accessed = ? WHERE key = ?",
+                       [(accessed, key) for key, accessed in touched.items()])
+
+    def records(self, model, tag=None, limit=None):
+        """(input, output) pairs of a model (and tag), most recent last."""
+        query = "SELECT input, output FROM evaluations WHERE model = ?"
+        args = [model]
+        if tag is not None:
+            query += " AND tag = ?"
+            args.append(tag)
+        query += " ORDER BY accessed DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            args.append(int(limit))
+        rows = self.connection().execute(query, args).fetchall()
+        return [(json.loads(i), json.loads(o)) for i, o in reversed(rows)]
+
+    def nbytes(self):
+        return self.connection().execute("SELECT COALESCE(SUM(size), 0) FROM evaluations").fetchone()[0]
+
+    def __len__(self):
+        return self.connection().execute("SELECT COUNT(*) FROM evaluations").fetchone()[0]
+
+    def evict(self):
+        """Drop least recently used entries until the store is below 90% of max_bytes."""
+        target = 0.9 * self.max_bytes
+        with self.connection() as db:
+            self._flush_touched(db)
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM evaluations").fetchone()[0]
+            rows = db.execute("SELECT key, size FROM evaluations ORDER BY accessed").fetchall()
+            drop = []
+            for key, size in rows:
+                if total <= target:
+                    break
+                drop.append((key,))
+                total -= size
+            db.executemany("DELETE FROM evaluations WHERE key = ?", drop)
+        self._bytes = total
+
+    def close(self):
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            with db:
+                self._flush_touched(db)
+            db.close()
+            self._local.db = None
+
+class StoredModel(umbridge.Model):
+    """
+    UM-Bridge model whose evaluations go through an EvaluationStore: stored
+    results are returned without a request, new ones are written back.
+    Other requests are passed through.
+
+    Attributes:
+        tag (str): Written with new entries, e.g. the settings inputs were drawn with.
+        hits (int): Evaluations answered from the store.
+        misses (int): Evaluations passed to the model.
+    """
+
+    def __init__(self, model, store, tag=None):
+        super().__init__(model.name)
+        self.model = model
+        self.store = store
+        self.tag = tag
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, parameters, config={}):
+        output = self.store.get(self.name, parameters, config)
+        if output is not None:
+            self.hits += 1
+            return output
+        self.misses += 1
+        output = self.model(parameters, config)
+        self.store.put(self.name, parameters, output, config, tag=self.tag)
+        return output
+
+    def evaluate_many(self, parameter_sets, config={}, map=map):
+        """
+        Evaluate several inputs with one store lookup and one write for the
+        batch. The missing ones are evaluated with `map`, e.g. the map of a
+        thread pool to send them concurrently.
+
+        Returns:
+            list: The output of each input.
+        """
+        outputs = self.store.get_many(self.name, parameter_sets, config)
+        todo = [i for i, output in enumerate(outputs) if output is None]
+        self.hits += len(outputs) - len(todo)
+        self.misses += len(todo)
+        if todo:
+            for i, output in zip(todo, map(lambda i: self.model(parameter_sets[i], config), todo)):
+                outputs[i] = output
+            self.store.put_many(self.name, [parameter_sets[i] for i in todo], [outputs[i] for i in todo],
+                                config, tag=self.tag)
+        return outputs
+
+    def get_input_sizes(self, config={}):
+        return self.model.get_input_sizes(config)
+
+    def get_output_sizes(self, config={}):
+        return self.model.get_output_sizes(config)
+
+    def supports_evaluate(self):
+        return self.model.supports_evaluate()
+
+    def supports_gradient(self):
+        return self.model.supports_gradient()
+
+    def supports_apply_jacobian(self):
+        return self.model.supports_apply_jacobian()
+
+    def supports_apply_hessian(self):
+        return self.model.supports_apply_hessian()
+
+    def gradient(self, out_wrt, in_wrt, parameters, sens, config={}):
+        return self.model.gradient(out_wrt, in_wrt, parameters, sens, config)
+
+    def apply_jacobian(self, out_wrt, in_wrt, parameters, vec, config={}):
+        return self.model.apply_jacobian(out_wrt, in_wrt, parameters, vec, config)
+
+    def apply_hessian(self, out_wrt, in_wrt1, in_wrt2, parameters, sens, vec, config={}):
+        return self.model.apply_hessian(out_wrt, in_wrt1, in_wrt2, parameters, sens, vec, config)
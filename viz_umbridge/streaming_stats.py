@@ -0,0 +1,261 @@
+import numpy as np
+
+__all__ = ["WindowedMoments", "StreamingHistogram"]
+
+class WindowedMoments:
+    """
+    Running mean and variance over a sliding window (Welford/Chan updates).
+    Values can be added and removed in batches, so the statistics follow the
+    contents of a ring buffer at a cost proportional to the inserted and
+    evicted samples. NaN values are ignored.
+
+    The element shape is taken from the first batch: a buffer of floats gives
+    scalar statistics, a buffer of rows gives one statistic per column.
+
+    Attributes:
+        count (np.ndarray): Number of values currently in the window.
+        mean (np.ndarray): Mean of the window (NaN where empty).
+        m2 (np.ndarray): Sum of squared deviations from the mean.
+    """
+
+    def __init__(self):
+        self.count = None
+        self.mean = None
+        self.m2 = None
+
+    def _init(self, shape):
+        self.count = np.zeros(shape)
+        self.mean = np.full(shape, np.nan)
+        self.m2 = np.zeros(shape)
+
+    def _batch(self, values):
+        values = np.asarray(values, dtype=float)
+        if self.count is None:
+            self._init(values.shape[1:])
+        valid = np.isfinite(values)
+        count = valid.sum(axis=0)
+        total = np.where(valid, values, 0).sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = total / count
+        m2 = np.where(valid, (values - mean)**2, 0).sum(axis=0)
+        return count, np.where(count > 0, mean, 0), m2
+
+    def add(self, values):
+        """
+        Add a batch of values.
+
+        Args:
+            values (array_like): Array of shape (k,) + element shape.
+        """
+        count_b, mean_b, m2_b = self._batch(values)
+        count = self.count + count_b
+        mean_a = np.where(self.count > 0, self.mean, 0)
+        delta = mean_b - mean_a
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.mean = np.where(count > 0, mean_a + delta * count_b / count, np.nan)
+            self.m2 = np.where(count > 0, self.m2 + m2_b + delta**2 * self.count * count_b / count, 0)
+        self.count = count
+
+    def remove(self, values):
+        """
+        Remove a batch of values that were previously added.
+
+        Args:
+            values (array_like): Array of shape (k,) + element shape.
+        """
+        count_b, mean_b, m2_b = self._batch(values)
+        count = self.count - count_b
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_a = (self.count * np.where(self.count > 0, self.mean, 0) - count_b * mean_b) / count
+            delta = mean_b - mean_a
+            m2 = self.m2 - m2_b - delta**2 * count * count_b / self.count
+        self.mean = np.where(count > 0, mean_a, np.nan)
+        self.m2 = np.where(count > 0, np.maximum(m2, 0), 0)
+        self.count = count
+
+    def variance(self, ddof=0):
+        """Variance of the window (NaN where fewer than ddof+1 values)."""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.count > ddof, self.m2 / (self.count - ddof), np.nan)
+
+    def std(self, ddof=0):
+        """Standard deviation of the window."""
+        return np.sqrt(self.variance(ddof))
+
+
+class StreamingHistogram:
+    """
+    Fixed-bin histogram sketch over a sliding window, used for approximate
+    quantiles. Inserting or evicting a value increments or decrements one bin.
+
+    Bins lie on a grid of width 2**e, so a bin is floor(v / 2**e) exactly and
+    doubling the width merges neighbouring bins exactly; evicted values always
+    decrement the bin they were counted in. The range follows the occupied
+    bins and the width only doubles when the values no longer fit in `bins`
+    bins. Quantiles are interpolated within a bin, so their error is about a
+    bin width (more in sparse tails). NaN values are ignored.
+
+    Counts alone can't be split into finer bins, so the width can only shrink
+    again through refit(), which rebuilds narrow elements from the values of
+    the window (FixedSizeArrayBuffer calls it after every write).
+
+    Attributes:
+        bins (int): Number of bins per element.
+        counts (np.ndarray): (elements x bins) counts.
+        exponent (np.ndarray): Bin width exponent of each element.
+        offset (np.ndarray): Grid index of the first bin of each element.
+    """
+
+    def __init__(self, bins=256):
+        self.bins = bins
+        self.shape = None
+        self.counts = None
+        self.exponent = None
+        self.offset = None
+
+    def _init(self, shape):
+        self.shape = shape
+        size = int(np.prod(shape))
+        self.counts = np.zeros((size, self.bins), dtype=np.int64)
+        self.exponent = np.zeros(size, dtype=int)
+        self.offset = np.zeros(size)
+        self.empty = np.ones(size, dtype=bool)  # no grid chosen yet
+
+    def _cells(self, values):
+        # grid index of every value for its element's current bin width
+        return np.floor(np.ldexp(values, -self.exponent))
+
+    def _fit(self, i, values):
+        # rescale/shift element i so that its occupied bins and `values` fit
+        if self.empty[i]:
+            # start with a fine grid around the first value
+            self.exponent[i] = np.frexp(np.max(np.abs(values)))[1] - 30
+            self.empty[i] = False
+            self.counts[i] = 0
+            self.offset[i] = np.floor(np.ldexp(values[0], -self.exponent[i])) - self.bins // 2
+        occupied = np.nonzero(self.counts[i])[0]
+        lo = min(np.floor(np.ldexp(values.min(), -self.exponent[i])),
+                 self.offset[i] + occupied[0] if len(occupied) else np.inf)
+        hi = max(np.floor(np.ldexp(values.max(), -self.exponent[i])),
+                 self.offset[i] + occupied[-1] if len(occupied) else -np.inf)
+        if lo >= self.offset[i] and hi < self.offset[i] + self.bins:
+            return
+        counts = self.counts[i]
+        cells = self.offset[i] + occupied
+        while hi - lo + 1 > self.bins:
+            # double the bin width, merging bins exactly
+            self.exponent[i] += 1
+            lo, hi, cells = np.floor(lo / 2), np.floor(hi / 2), np.floor(cells / 2)
+        offset = lo - (self.bins - (hi - lo + 1)) // 2  # centre the occupied range
+        new_counts = np.zeros(self.bins, dtype=np.int64)
+        np.add.at(new_counts, (cells - offset).astype(int), counts[occupied])
+        self.counts[i] = new_counts
+        self.offset[i] = offset
+
+    def _exponent(self, lo, hi):
+        # smallest bin width exponent at which [lo, hi] spans at most half the bins
+        fine = np.frexp(max(abs(lo), abs(hi)))[1] - 30
+        if hi == lo:
+            return fine
+        exponent = max(fine, int(np.ceil(np.log2((hi - lo) / (self.bins // 2 - 1)))))
+        while np.floor(np.ldexp(hi, -exponent)) - np.floor(np.ldexp(lo, -exponent)) + 1 > self.bins // 2:
+            exponent += 1
+        return exponent
+
+    def refit(self, window):
+        """
+        Rebuild the counts at a finer bin width for elements whose occupied
+        bins span less than a quarter of the bins, e.g. once the wide values
+        of a transient have been evicted.
+
+        Args:
+            window (array_like): All values currently in the histogram, of
+                shape (k,) + element shape.
+        """
+        if self.shape is None or self.bins < 8:
+            return
+        occupied = self.counts > 0
+        first = np.argmax(occupied, axis=1)
+        last = self.bins - 1 - np.argmax(occupied[:, ::-1], axis=1)
+        narrow = np.nonzero(occupied.any(axis=1) & (last - first + 1 < self.bins // 4))[0]
+        if not len(narrow):
+            return
+        values, valid = self._flatten(window)
+        for i in narrow:
+            v = values[valid[:, i], i]
+            if not len(v):
+                continue
+            exponent = self._exponent(v.min(), v.max())
+            if exponent >= self.exponent[i]:
+                continue  # already as fine as it gets
+            cells = np.floor(np.ldexp(v, -exponent))
+            lo, hi = cells.min(), cells.max()
+            offset = lo - (self.bins - (hi - lo + 1)) // 2
+            self.counts[i] = np.bincount((cells - offset).astype(int), minlength=self.bins)
+            self.exponent[i] = exponent
+            self.offset[i] = offset
+
+    def _flatten(self, values):
+        values = np.asarray(values, dtype=float).reshape(len(values), -1)
+        return values, np.isfinite(values)
+
+    def add(self, values):
+        """
+        Add a batch of values.
+
+        Args:
+            values (array_like): Array of shape (k,) + element shape.
+        """
+        values = np.asarray(values, dtype=float)
+        if self.shape is None:
+            self._init(values.shape[1:])
+        values, valid = self._flatten(values)
+        for i in np.nonzero(valid.any(axis=0))[0]:
+            self._fit(i, values[valid[:, i], i])
+        self._update(values, valid, 1)
+
+    def remove(self, values):
+        """
+        Remove a batch of values that were previously added.
+
+        Args:
+            values (array_like): Array of shape (k,) + element shape.
+        """
+        values, valid = self._flatten(values)
+        self._update(values, valid, -1)
+
+    def _update(self, values, valid, sign):
+        cells = self._cells(np.where(valid, values, 0)) - self.offset
+        bins = np.clip(cells, 0, self.bins - 1).astype(int)
+        flat = (np.arange(values.shape[1]) * self.bins + bins)[valid]
+        self.counts += sign * np.bincount(flat, minlength=self.counts.size).reshape(self.counts.shape)
+
+    def edges(self):
+        """
+        Returns:
+            np.ndarray: (elements x bins+1) bin edges.
+        """
+        grid = self.offset[:, None] + np.arange(self.bins + 1)
+        return np.ldexp(grid, self.exponent[:, None])
+
+    def quantile(self, q):
+        """
+        Approximate q-th quantile (0 <= q <= 1) of the window, using the rank
+        convention of np.percentile and spreading the values of a bin evenly
+        across it. NaN for elements without values.
+        """
+        if self.shape is None:
+            return np.nan
+        total = self.counts.sum(axis=1)
+        cum = np.cumsum(self.counts, axis=1)
+        rank = q * np.maximum(total - 1, 0)
+        # bin holding the value with this (0-based) rank
+        idx = np.argmax(cum > rank[:, None], axis=1)
+        rows = np.arange(len(total))
+        before = cum[rows, idx] - self.counts[rows, idx]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            frac = np.clip((rank - before + 0.5) / self.counts[rows, idx], 0, 1)
+        edges = self.edges()
+        width = edges[rows, idx + 1] - edges[rows, idx]
+        result = np.where(total > 0, edges[rows, idx] + frac * width, np.nan)
+        return result.reshape(self.shape)